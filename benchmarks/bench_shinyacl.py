@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Benchmarks ShinyACL against a synthetic project space tree held in a
+``ShinyACLMemoryBackend``. Use ``--latency`` to simulate NFS round trips
+and ``--memory`` to compare the memory used by a full inventory with the
+former dict-of-lists representation.
+
+  PYTHONPATH=. python benchmarks/bench_shinyacl.py --projects 50 --apps 1000
+"""
+
+import gc
+import os
+import sys
+import time
+import random
+import resource
+from argparse import ArgumentParser
+from shinyacl import ShinyACL, ShinyACLMemoryBackend
+
+ROOT = '/home/bench/shared_space'
+
+def build(projects, apps, users, latency):
+  """Returns a memory backend holding ``projects`` project spaces of
+  ``apps`` apps each, every app granting ``users`` users."""
+
+  fs = ShinyACLMemoryBackend()
+  fs.mkdir(ROOT)
+  pool = map(lambda n: 'user{0}@g.harvard.edu'.format(n), range(users * 10))
+
+  for p in range(projects):
+    project = '/nfs/www/shinyserver/project{0}'.format(p)
+    fs.mkdir(project)
+    fs.symlink(project, '{0}/project{1}'.format(ROOT, p))
+    for a in range(apps):
+      app = '{0}/app{1}'.format(project, a)
+      fs.mkdir(app)
+      fs.write('{0}/server.R'.format(app), '')
+      fs.write('{0}/.shiny_app.conf'.format(app), 'required_user {0};\n'.format(
+        ' '.join(random.sample(pool, users))))
+
+  fs.calls = {}
+  fs.latency = latency
+  return fs
+
+def legacy(acl):
+  """Builds the app tree and ACLs the way ShinyACL used to: a list of
+  absolute paths per project space and a list of usernames per app."""
+
+  tree = dict(map(lambda p: (p, acl.__get_shiny_sub_apps__(p)),
+    acl.__project_spaces__))
+  acls = {}
+  for apps in tree.itervalues():
+    for app in apps:
+      acls[app] = acl.__parse_users__(
+        acl.backend.read('{0}/.shiny_app.conf'.format(app)))
+  return tree, acls
+
+def compact(acl):
+  return acl.inventory()
+
+def rss():
+  """Returns the resident set size of this process in bytes."""
+
+  with open('/proc/self/statm') as statm:
+    return int(statm.read().split()[1]) * resource.getpagesize()
+
+def measure(label, fn, fs):
+  """Reports the memory retained by ``fn``'s result, measured in a forked
+  child so each representation starts from the same heap."""
+
+  pid = os.fork()
+  if pid == 0:
+    acl = ShinyACL(ROOT, backend=fs)
+    gc.collect()
+    before = rss()
+    result = fn(acl)
+    gc.collect()
+    print '{0:<24} {1:>10.1f} MB'.format(label,
+      (rss() - before) / 1024.0 / 1024.0)
+    os._exit(0)
+  os.waitpid(pid, 0)
+
+def timed(label, fn):
+  start = time.time()
+  result = fn()
+  print '{0:<24} {1:>10.3f} ms'.format(label, (time.time() - start) * 1000)
+  return result
+
+def main():
+  parser = ArgumentParser(description='Benchmark ShinyACL operations')
+  parser.add_argument('--projects', type=int, default=10)
+  parser.add_argument('--apps', type=int, default=1000)
+  parser.add_argument('--users', type=int, default=5)
+  parser.add_argument('--latency', type=float, default=0,
+    help='Seconds of injected latency per filesystem call')
+  parser.add_argument('--memory', action='store_true',
+    help='Report memory used by the app tree and ACLs of every app')
+  args = parser.parse_args()
+
+  fs = timed('build fixture', lambda: build(args.projects, args.apps,
+    args.users, args.latency))
+  acl = ShinyACL(ROOT, backend=fs)
+  timed('discovery', lambda: acl.__apps__)
+  app = acl.__apps__.values()[0][0]
+  timed('get_users', lambda: acl.get_users(app))
+  timed('reload', lambda: acl.reload(app))
+  timed('inventory', acl.inventory)
+
+  print 'filesystem calls: {0}'.format(', '.join(map(
+    lambda (k, v): '{0}={1}'.format(k, v), sorted(fs.calls.items()))))
+
+  if args.memory:
+    fs.latency = 0
+    sys.stdout.flush()
+    measure('legacy tree and ACLs', legacy, fs)
+    measure('inventory', compact, fs)
+
+  return 0
+
+if __name__ == '__main__':
+  exit(main())
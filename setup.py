@@ -7,5 +7,7 @@ setup(name='rshiny_acl',
       author='Evan Sarmiento',
       author_email='esarmien@g.harvard.edu',
       packages=['shinyacl'],
-      scripts=['scripts/rshiny_acl']
+      scripts=['scripts/rshiny_acl'],
+      data_files=[('share/bash-completion/completions',
+                   ['completion/rshiny_acl'])]
 )
@@ -10,29 +10,61 @@ __email__ = "esarmien@g.harvard.edu"
 
 import os
 import re
+import time
+import errno
 import subprocess
 import logging
 import logging.handlers
 import pwd
+import fnmatch
+import threading
+from itertools import islice
+from multiprocessing.pool import ThreadPool
 from shinyacl import ShinyACLUserAlreadyExists, \
 ShinyACLUserDoesNotExist, \
 ShinyACLNotAShinyApp, \
-ShinyACLNotAValidEmail
+ShinyACLNotAValidEmail, \
+ShinyACLConfModified
+from shinyacl.ShinyACLMetrics import ShinyACLNullMetrics
+from shinyacl.ShinyACLBackend import ShinyACLLocalBackend
+from shinyacl.ShinyACLScheduler import ShinyACLThrottledBackend
+from shinyacl.ShinyACLCatalog import conf_hash
+from shinyacl.ShinyACLInventory import ShinyACLProject, ShinyACLInventory
+from shinyacl.ShinyACLIndex import ShinyACLAppIndex
+from shinyacl.ShinyACLCheck import REQUIRED_USER_REGEX, PROBLEMS, \
+valid_username, check_conf
 
 DOTRSHINYCONF_TEMPLATE = "required_user {0};\n"
 
-class ShinyACL:
+class ShinyACL(object):
   """The ShinyACL class provides methods which add, remove users to an 
   application's ACL in .shiny.conf and restarts that application.
   """
 
   def __init__(self,
-   __root__ = '{0}/shared_space'.format(os.path.expanduser('~'))):
+   __root__ = '{0}/shared_space'.format(os.path.expanduser('~')),
+   metrics = None,
+   backend = None,
+   catalog = None,
+   scheduler = None):
    """ShinyACL class initialization method.
 
    :param __root__: Optional, specifies where to look for shared_space
                     directories
    :type __root__: ``str``
+   :param metrics: Optional, registry which records operation counts,
+                   latencies and inventory sizes
+   :type metrics: :py:class:`shinyacl.ShinyACLMetrics.ShinyACLMetrics`
+   :param backend: Optional, filesystem backend every filesystem call is
+                   made through. Defaults to the local/NFS filesystem.
+   :type backend: :py:class:`shinyacl.ShinyACLBackend.ShinyACLLocalBackend`
+   :param catalog: Optional, SQLite catalog reads are answered from and
+                   ``.shiny_app.conf`` files are written from
+   :type catalog: :py:class:`shinyacl.ShinyACLCatalog.ShinyACLCatalog`
+   :param scheduler: Optional, I/O scheduler every filesystem call waits
+                     for. Share one to hold several ``ShinyACL`` to one
+                     I/O budget.
+   :type scheduler: :py:class:`shinyacl.ShinyACLScheduler.ShinyACLScheduler`
    
    :Example:
 
@@ -46,18 +78,91 @@ class ShinyACL:
    """
 
    self.__root__ = __root__
+   self.metrics = ShinyACLNullMetrics() if metrics is None else metrics
+   self.backend = ShinyACLLocalBackend() if backend is None else backend
+   if scheduler is not None:
+     self.backend = ShinyACLThrottledBackend(self.backend, scheduler)
+   self.catalog = catalog
    self.__project_spaces__ = self.__get_shiny_project_spaces__(self.__root__)
-   self.__apps__ = self.__build_shiny_app_tree__(self.__project_spaces__)
+   self.__app_tree__ = None
+   self.__app_index__ = None
+   self.__app_tree_lock__ = threading.Lock()
    self.log = logging.getLogger(__name__)
    self.log.setLevel(logging.CRITICAL)
 
-   handler = logging.handlers.SysLogHandler(address = '/dev/log')
-   logging.Formatter('%(module)s.%(funcName)s: %(message)s')
-   handler.setFormatter(logging.Formatter('%(module)s.%(funcName)s: %(message)s'))
+   # The logger is shared by every ShinyACL of the process; a second
+   # handler would send each audit line twice.
+   if self.log.handlers == []:
+     handler = logging.handlers.SysLogHandler(address = '/dev/log')
+     handler.setFormatter(logging.Formatter('%(module)s.%(funcName)s: %(message)s'))
+     self.log.addHandler(handler)
 
-   self.log.addHandler(handler)
    return None
 
+  @property
+  def __apps__(self):
+    """Mapping of project spaces to the apps in them. Built by
+    ``__build_shiny_app_tree__`` on first access, so operations which
+    only need part of the tree, like ``find_applications``, never scan
+    every project space.
+
+    :rtype: ``dict``
+    """
+
+    with self.__app_tree_lock__:
+      if self.__app_tree__ is None:
+        self.__app_tree__ = \
+          self.__build_shiny_app_tree__(self.__project_spaces__)
+    return self.__app_tree__
+
+  def resolve(self, app):
+    """Returns the fully qualified path of ``app``. Besides fully
+    qualified paths, accepts relative paths, paths through
+    ``shared_space`` symlinks, and unambiguous short names like
+    ``project/app`` or ``app``. Raises exception, with the nearest
+    applications as suggestions, if ``app`` does not name exactly one
+    RShiny application.
+
+    :param app: Path to, or short name of, an application
+    :type app: ``str``
+    :rtype: ``str``
+    :raises:
+      :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLNotAShinyApp`
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> ShinyACL().resolve('vpal/hello')
+    '/nfs/www/shinyserver/vpal/hello'
+    """
+
+    if self.__contains_app__(app):
+      return app
+
+    path = os.path.abspath(app)
+    if self.__contains_app__(path):
+      return path
+
+    index = self.__app_index__
+    candidates = [] if app.startswith(('/', '.')) else index.lookup(app)
+    if len(candidates) == 1:
+      return candidates[0]
+
+    try:
+      path = self.backend.realpath(path)
+    except OSError as e:
+      pass
+    if self.__contains_app__(path):
+      return path
+
+    raise ShinyACLNotAShinyApp(app, sorted(candidates) or index.suggest(app))
+
+  def __contains_app__(self, app):
+    """Returns ``True`` if fully qualified ``app`` is in the app tree."""
+
+    project = self.__apps__.get(os.path.dirname(app))
+    return project is not None and app in project
+
   def __get_shiny_project_spaces__(self, __root__):
    """Returns an array of project spaces in ``__root__`` directory.
    Determines if this is a shinyserver project space by looking at
@@ -76,12 +181,14 @@ class ShinyACL:
    """
 
    return filter(lambda t: 'shinyserver' in t.split('/'),
-    map(lambda d: os.path.realpath(os.path.join(__root__, d)),
-      os.listdir(__root__)))
+    map(lambda d: self.backend.realpath(os.path.join(__root__, d)),
+      self.backend.listdir(__root__)))
 
   def __build_shiny_app_tree__(self, projectspaces):
     """Builds a hash mapping of project directories to apps in those
-    project directories.
+    project directories. Each project's apps are held in a
+    :py:class:`shinyacl.ShinyACLInventory.ShinyACLProject`, which
+    behaves like a sorted list of app paths.
 
     :param projectspaces: An array of project spaces, usually this is
                           the resultant list from
@@ -103,18 +210,31 @@ class ShinyACL:
     """ 
      
     __tree__ = {}
-    for projectspace in projectspaces:
-      __tree__[projectspace] = \
-        self.__get_shiny_sub_apps__(projectspace)
+    with self.metrics.track('discovery'):
+      for projectspace in projectspaces:
+        __tree__[projectspace] = ShinyACLProject(projectspace,
+          map(os.path.basename, self.__get_shiny_sub_apps__(projectspace)))
+        self.metrics.set('shinyacl_project_apps', len(__tree__[projectspace]),
+          {'project': projectspace})
+
+      self.__app_index__ = ShinyACLAppIndex()
+      for projectspace in sorted(__tree__.keys()):
+        self.__app_index__.add(__tree__[projectspace])
+
     return __tree__
 
-  def __get_shiny_sub_apps__(self,projectspace):
-    """Returns a list of apps belonging to an rShiny project space. A
-    directory is determined to be an rShiny app if it has a ``server.R``
-    or ``index.Rmd`` in it. 
+  def __get_shiny_sub_apps__(self, projectspace, match=None, limit=None):
+    """Returns a sorted list of apps belonging to an rShiny project
+    space. A directory is determined to be an rShiny app if it has a
+    ``server.R`` or ``index.Rmd`` in it. Directory entries rejected by
+    ``match`` are skipped before any of them is stat'ed.
 
     :param projectspace: Fully qualified path to project space
     :type projectspace: ``str``
+    :param match: Optional, predicate on the directory entry name
+    :type match: ``callable``
+    :param limit: Optional, stop after finding this many apps
+    :type limit: ``int``
     :rtype: ``list``
 
     :Example:
@@ -128,10 +248,153 @@ class ShinyACL:
 
     """
 
-    return filter(lambda d: os.path.isfile('{0}/server.R'.format(d)) or os.path.isfile('{0}/index.Rmd'.format(d)), 
-        filter(os.path.isdir, 
-          map(lambda d: os.path.join(projectspace, d),
-            os.listdir(projectspace))))
+    return list(islice(self.__iter_shiny_sub_apps__(projectspace, match),
+      limit))
+
+  def __iter_shiny_sub_apps__(self, projectspace, match=None):
+    """Yields the apps of ``projectspace`` in sorted order as they are
+    found, like ``__get_shiny_sub_apps__``."""
+
+    for name in sorted(self.backend.listdir(projectspace)):
+      if match is not None and not match(name):
+        continue
+
+      d = os.path.join(projectspace, name)
+      if self.__is_shiny_app__(d):
+        yield d
+
+  def __is_shiny_app__(self, d):
+    """Returns ``True`` if directory ``d`` has a ``server.R`` or
+    ``index.Rmd`` in it.
+
+    :param d: Fully qualified path to a directory
+    :type d: ``str``
+    :rtype: ``bool``
+    """
+
+    return self.backend.isdir(d) and \
+      (self.backend.isfile('{0}/server.R'.format(d)) or
+       self.backend.isfile('{0}/index.Rmd'.format(d)))
+
+  def discover(self, project=None, pattern=None, regex=None):
+    """Yields ``(project space, app)`` tuples matching the given
+    filters in path order, each as soon as it is found. Project spaces
+    are scanned one at a time, and only as far as the caller consumes
+    the results. Name filters are applied to directory entries before
+    they are stat'ed, and only matching project spaces are listed. Uses
+    the app tree instead if it has already been built.
+
+    Only the time spent scanning is recorded, as a ``discovery``
+    operation if every project space was scanned fully and unfiltered,
+    and as ``discovery_partial`` otherwise. Project spaces scanned fully
+    without a name filter update ``shinyacl_project_apps``.
+
+    :param project: Optional, project space path, name or glob
+    :type project: ``str``
+    :param pattern: Optional, glob the app directory name must match
+    :type pattern: ``str``
+    :param regex: Optional, regular expression searched for in the app
+                  directory name
+    :type regex: ``str``
+    :rtype: ``generator``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> next(ShinyACL().discover(project='vpal'))
+    ('/nfs/www/shinyserver/vpal', '/nfs/www/shinyserver/vpal/courseviz')
+    """
+
+    compiled = re.compile(regex) if regex is not None else None
+    match = lambda name: \
+      (pattern is None or fnmatch.fnmatchcase(name, pattern)) and \
+      (compiled is None or compiled.search(name) is not None)
+
+    # Time spent waiting for the consumer is not scan time, so the
+    # filesystem work is timed one step at a time.
+    elapsed = 0.0
+    scanned = False
+    complete = project is None and pattern is None and regex is None
+    error = None
+
+    try:
+      for projectspace in sorted(self.__project_spaces__):
+        if project is not None and project != projectspace and \
+          not fnmatch.fnmatchcase(os.path.basename(projectspace), project):
+          continue
+
+        if self.__app_tree__ is not None:
+          for name in filter(match, self.__app_tree__[projectspace].names):
+            yield projectspace, os.path.join(projectspace, name)
+          continue
+
+        scanned = True
+        apps = self.__iter_shiny_sub_apps__(projectspace, match)
+        found = 0
+        while True:
+          start = time.time()
+          try:
+            app = next(apps, None)
+          finally:
+            elapsed += time.time() - start
+          if app is None:
+            break
+          found += 1
+          yield projectspace, app
+
+        if pattern is None and regex is None:
+          self.metrics.set('shinyacl_project_apps', found,
+            {'project': projectspace})
+    except GeneratorExit:
+      complete = False
+      raise
+    except Exception as e:
+      error = e
+      raise
+    finally:
+      if scanned:
+        self.metrics.record('discovery' if complete and error is None
+          else 'discovery_partial', elapsed, error)
+
+  def find_applications(self, project=None, pattern=None, regex=None,
+    sort='path', limit=None):
+    """Returns a list of ``(project space, app)`` tuples matching the
+    given filters, as found by ``discover``. A path sorted listing stops
+    scanning as soon as it has ``limit`` apps.
+
+    :param project: Optional, project space path, name or glob
+    :type project: ``str``
+    :param pattern: Optional, glob the app directory name must match
+    :type pattern: ``str``
+    :param regex: Optional, regular expression searched for in the app
+                  directory name
+    :type regex: ``str``
+    :param sort: ``path`` to order by project space and app path,
+                 ``name`` to order by app directory name
+    :type sort: ``str``
+    :param limit: Optional, maximum number of apps returned
+    :type limit: ``int``
+    :rtype: ``list``
+    :raises: ``ValueError`` if ``limit`` is negative
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> ShinyACL().find_applications(project='vpal', pattern='hello*')
+    [('/nfs/www/shinyserver/vpal', '/nfs/www/shinyserver/vpal/hello'),
+     ('/nfs/www/shinyserver/vpal',
+      '/nfs/www/shinyserver/vpal/hello_protected')]
+    """
+
+    if limit is not None and limit < 0:
+      raise ValueError('limit must not be negative: {0}'.format(limit))
+
+    found = self.discover(project, pattern, regex)
+
+    if sort == 'name':
+      return sorted(found, key=lambda (p, a): (os.path.basename(a), a))[:limit]
+
+    return list(islice(found, limit))
  
   # UNUSED function commented out. 
   # def __get_project_space_name__(self,path):
@@ -143,7 +406,8 @@ class ShinyACL:
     RShiny application. Returns an empty array if no users or configured
     or if ``.shiny_app.conf`` does not exist in the app directory.
 
-    :param app: Fully qualified path to application directory
+    :param app: Path to, or short name of, an application, see
+                ``resolve``
     :type app: ``str``
     :rtype: ``list``
     :raises:
@@ -157,20 +421,190 @@ class ShinyACL:
 
     """   
 
-    if filter(lambda (k,v): app in v, self.__apps__.iteritems()) == []:
-      raise ShinyACLNotAShinyApp(app)
+    with self.metrics.track('get_users'):
+      return self.__read_users__(self.resolve(app))
 
-    try:
-      with open('{0}/.shiny_app.conf'.format(app), 'r') as dotshinyconf:
-        users = filter(lambda l: re.findall('^required_user.*;$', l), dotshinyconf.readlines())
+  def __read_users__(self, app, verify=False):
+    """Returns the users allowed to access ``app`` from the catalog or,
+    if the app is not cataloged, from its ``.shiny_app.conf``. Unlike
+    ``get_users`` this does not check ``app`` against the app tree.
+
+    :param app: Fully qualified path to application directory
+    :type app: ``str``
+    :param verify: Optional, re-import the file if it was edited outside
+                   the catalog. Used before changing an ACL.
+    :type verify: ``bool``
+    :rtype: ``list``
+    """
+
+    users = None if self.catalog is None else self.catalog.get_users(app)
+
+    if users is None or verify:
+      try:
+        data = self.backend.read('{0}/.shiny_app.conf'.format(app))
+      except IOError as e:
+        data = None
+
+      if users is None or self.catalog.get_hash(app) != conf_hash(data):
+        users = self.__parse_users__(data or '')
+        if self.catalog is not None:
+          self.catalog.set_users(app, os.path.dirname(app), users,
+            conf_hash(data))
+
+    self.metrics.set('shinyacl_app_users', len(users), {'app': app})
+    return users
+
+  def inventory(self):
+    """Loads the ACL of every app into a compact
+    :py:class:`shinyacl.ShinyACLInventory.ShinyACLInventory`.
+
+    :rtype: :py:class:`shinyacl.ShinyACLInventory.ShinyACLInventory`
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> inventory = ShinyACL().inventory()
+    >>> inventory.get_users('/nfs/www/shinyserver/vpal/hello')
+    ['dtingley@g.harvard.edu', 'v@v.com']
+    """
 
-        if len(users) == 0:
-          return []
+    inventory = ShinyACLInventory(self.__apps__)
 
-        return filter(lambda u: u != '', users[0].rstrip()[:-1].split(' ')[1:])
-    except IOError as e:
+    with self.metrics.track('inventory'):
+      for app in inventory:
+        inventory.set_users(app, self.__read_users__(app))
+
+    return inventory
+
+  def __parse_users__(self, data):
+    """Returns the users on the first ``required_user`` line of
+    ``.shiny_app.conf`` contents ``data``.
+
+    :param data: Contents of a ``.shiny_app.conf`` file
+    :type data: ``str``
+    :rtype: ``list``
+    """
+
+    users = filter(REQUIRED_USER_REGEX.match, data.splitlines())
+
+    if len(users) == 0:
       return []
 
+    return filter(lambda u: u != '', users[0].rstrip()[:-1].split(' ')[1:])
+
+  def verify_catalog(self, resync=False):
+    """Compares every app's ``.shiny_app.conf`` with the content hash
+    recorded in the catalog and returns the apps which were edited out
+    of band, or which are cataloged but no longer exist. Apps missing
+    from the catalog are imported.
+
+    :param resync: Optional, re-import edited apps from their files and
+                   remove apps which no longer exist
+    :type resync: ``bool``
+    :rtype: ``list``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL, ShinyACLCatalog
+    >>> ShinyACL(catalog=ShinyACLCatalog('acl.db')).verify_catalog()
+    ['/nfs/www/shinyserver/vpal/hello']
+    """
+
+    drifted = []
+    found = set()
+
+    with self.metrics.track('verify_catalog'):
+      for projectspace, apps in sorted(self.__apps__.iteritems()):
+        found.update(apps)
+        for app in apps:
+          try:
+            data = self.backend.read('{0}/.shiny_app.conf'.format(app))
+          except IOError as e:
+            data = None
+
+          cataloged = self.catalog.get_users(app) is not None
+          if cataloged and self.catalog.get_hash(app) == conf_hash(data):
+            continue
+          if cataloged:
+            drifted.append(app)
+          if not cataloged or resync:
+            self.catalog.set_users(app, projectspace,
+              self.__parse_users__(data or ''), conf_hash(data))
+
+      gone = filter(lambda app: app not in found, self.catalog.apps())
+      drifted = sorted(drifted + gone)
+      if resync:
+        self.catalog.delete_apps(gone)
+      self.catalog.set_imported()
+
+    return drifted
+
+  def check(self, repair=False, max_workers=8, reload=True):
+    """Checks the ``.shiny_app.conf`` of every app for the problems
+    listed in :py:mod:`shinyacl.ShinyACLCheck`. Files are read by at
+    most ``max_workers`` threads. With ``repair``, each file with
+    problems is replaced by its repaired contents in a single write and,
+    if ``reload`` is set, its app is reloaded. Apps without a
+    ``.shiny_app.conf`` are not checked.
+
+    :param repair: Optional, repair the files with problems
+    :type repair: ``bool``
+    :param max_workers: Optional, number of files checked at a time
+    :type max_workers: ``int``
+    :param reload: Optional, reload each repaired app
+    :type reload: ``bool``
+    :retval: A mapping of every checked app to its problems, and a
+             mapping of apps which could not be checked or repaired to
+             the error raised
+    :rtype: ``tuple``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> ShinyACL().check()
+    ({'/nfs/www/shinyserver/vpal/hello': ['duplicate-user']}, {})
+    """
+
+    def check(app):
+      dotshinyconf = '{0}/.shiny_app.conf'.format(app)
+      try:
+        if not self.backend.isfile(dotshinyconf):
+          return app, None, None
+        problems, repaired = check_conf(self.backend.read(dotshinyconf))
+        if repair and repaired is not None:
+          with self.metrics.track('write'):
+            self.backend.write(dotshinyconf, repaired)
+            if self.catalog is not None:
+              self.catalog.set_users(app, os.path.dirname(app),
+                self.__parse_users__(repaired), conf_hash(repaired))
+          self.log.critical("{0} repaired {1} of {2}".format(
+            pwd.getpwuid(os.getuid())[0], dotshinyconf, ', '.join(problems)))
+          if reload:
+            self.reload(app)
+        return app, problems, None
+      except (IOError, OSError) as e:
+        return app, None, e
+
+    with self.metrics.track('check'):
+      apps = list(self.discover())
+      workers = max(1, min(max_workers, len(apps)))
+      pool = ThreadPool(workers)
+      try:
+        results = pool.map(check, map(lambda (p, a): a, apps),
+          max(1, len(apps) / (workers * 4)))
+      finally:
+        pool.close()
+        pool.join()
+
+    for problem in PROBLEMS:
+      self.metrics.set('shinyacl_conf_problems', len(filter(
+        lambda (a, p, e): p and problem in p, results)), {'problem': problem})
+
+    return dict(map(lambda (a, p, e): (a, p),
+        filter(lambda (a, p, e): p is not None, results))), \
+      dict(map(lambda (a, p, e): (a, e),
+        filter(lambda (a, p, e): e is not None, results)))
+
   def __write__(self, app, authstring):
     """Writes the ``.shiny_app.conf`` file inside the app directory by
        modifying the required_user line. No need to use this as higher
@@ -189,28 +623,52 @@ class ShinyACL:
           'required_user esarmien@g.harvard.edu;')
 
     """
-    
-      
-    with open('{0}/.shiny_app.conf'.format(app), 'w+') as dotshinyconf:
-      data = dotshinyconf.readlines()
-      line = filter(lambda index: index >= 0, map(lambda line: None if re.findall('^required_user.*;$', line) == [] else dotshinyconf.index(line), data))
 
-      assert len(line) <= 1
+    with self.metrics.track('write'):
+      dotshinyconf = '{0}/.shiny_app.conf'.format(app)
+
+      try:
+        current = self.backend.read(dotshinyconf)
+      except IOError as e:
+        current = None
+
+      # authstring was computed from the catalog; never let it undo an
+      # edit made to the file since.
+      if self.catalog is not None and \
+        self.catalog.get_users(app) is not None and \
+        self.catalog.get_hash(app) != conf_hash(current):
+        self.catalog.set_users(app, os.path.dirname(app),
+          self.__parse_users__(current or ''), conf_hash(current))
+        raise ShinyACLConfModified(app)
+
+      data = (current or '').splitlines(True)
+
+      line = filter(lambda index: REQUIRED_USER_REGEX.match(
+        data[index].rstrip('\r\n')), range(len(data)))
 
       # There is no such line in the file
       if line == []:
-        dotshinyconf.write(authstring);
-      else: 
+        if data != [] and not data[-1].endswith('\n'):
+          data[-1] += '\n'
+        data.append(authstring)
+      else:
         data[line[0]] = authstring
-        data.writelines(data)
-      
+
+      data = ''.join(data)
+      self.backend.write(dotshinyconf, data)
+
+      if self.catalog is not None:
+        self.catalog.set_users(app, os.path.dirname(app),
+          self.__parse_users__(authstring), conf_hash(data))
+
     return None
 
   def add_user(self,app,usernames):
     """Adds usernames to ``.shiny_app.conf`` for the specified app.
     Logs action to syslog per HEISP.
 
-    :param app: Fully qualified path to application directory
+    :param app: Path to, or short name of, an application, see
+                ``resolve``
     :type app: ``str``
     :param usernames: Array of usernames to add
     :type usernames: ``list``
@@ -220,6 +678,8 @@ class ShinyACL:
       :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLNotAValidEmail`
     :raises:
       :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLUserAlreadyExists`
+    :raises:
+      :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLConfModified`
 
     :Example:
 
@@ -229,14 +689,11 @@ class ShinyACL:
 
     """
 
-    email_regex = re.compile(
-      "^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
-    huid_regex = re.compile(
-      "^[0-9]{8}$"
-    )
+    app = self.resolve(app)
+    self.__read_users__(app, verify=True)
 
     for username in usernames:
-      if email_regex.findall(username) == [] and huid_regex.findall(username) == []:
+      if not valid_username(username):
         raise ShinyACLNotAValidEmail(username)
       elif username in self.get_users(app):
         raise ShinyACLUserAlreadyExists(username, app)
@@ -254,7 +711,8 @@ class ShinyACL:
     """Removes all usernames from ``.shiny_app.conf`` for specified app.
     Logs action to syslog per HEISP.
 
-    :param app: Fully qualified path to application directory
+    :param app: Path to, or short name of, an application, see
+                ``resolve``
     
     :Example:
 
@@ -262,6 +720,7 @@ class ShinyACL:
     >>> ShinyACL().del_all('/nfs/www/shinyserver/vpal/hello')
     """
 
+    app = self.resolve(app)
     executing_user = pwd.getpwuid(os.getuid())[0]
     self.__write__(app, DOTRSHINYCONF_TEMPLATE.format(''))
     self.log.critical("{0} removed all users from {1}".format(
@@ -273,7 +732,8 @@ class ShinyACL:
     """Removes usernames from ``.shiny_app.conf`` for specified app.
     Logs action to syslog per HEISP.
     
-    :param app: Fully qualified path to application directory
+    :param app: Path to, or short name of, an application, see
+                ``resolve``
     :type app: ``str``
     :param usernames: Array of usernames to add
     :type usernames: ``list``
@@ -290,6 +750,8 @@ class ShinyACL:
 
     """
 
+    app = self.resolve(app)
+    self.__read_users__(app, verify=True)
     for username in usernames:
       if username in self.get_users(app):
         executing_user = pwd.getpwuid(os.getuid())[0]
@@ -304,6 +766,145 @@ class ShinyACL:
 
     return None
 
+  def set_users(self, app, usernames):
+    """Replaces the ACL of ``app`` with ``usernames`` in a single write.
+    Logs action to syslog per HEISP.
+
+    :param app: Fully qualified path to application directory
+    :type app: ``str``
+    :param usernames: Array of usernames, in ACL order
+    :type usernames: ``list``
+    :retval: ``None``
+    :rtype: ``None``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> ShinyACL().set_users('/nfs/www/shinyserver/vpal/hello',
+          ['esarmien@g.harvard.edu', 'dtingley@g.harvard.edu'])
+    """
+
+    executing_user = pwd.getpwuid(os.getuid())[0]
+    self.__write__(app, DOTRSHINYCONF_TEMPLATE.format(' '.join(usernames)))
+    self.log.critical("{0} set users of {1} to {2}".format(
+      executing_user, app, ' '.join(usernames)))
+
+    return None
+
+  def copy_acl(self, src, dests, max_workers=8, reload=True):
+    """Gives every app in ``dests`` the same users as ``src``. The ACL of
+    ``src`` is read once. Only destinations whose users differ are
+    written, each with a single write followed, if ``reload`` is set, by
+    a single reload. Destinations are processed concurrently by at most
+    ``max_workers`` threads.
+
+    :param src: Path to, or short name of, the template application
+    :type src: ``str``
+    :param dests: Paths to, or short names of, destination applications
+    :type dests: ``list``
+    :param max_workers: Optional, number of concurrent destinations
+    :type max_workers: ``int``
+    :param reload: Optional, reload each changed destination
+    :type reload: ``bool``
+    :retval: The list of changed apps and a mapping of apps which
+             could not be changed to the error raised
+    :rtype: ``tuple``
+    :raises:
+      :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLNotAShinyApp`
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL
+    >>> ShinyACL().copy_acl('vpal/hello', ['vpal/courseviz', 'vpal/test_irt'])
+    (['/nfs/www/shinyserver/vpal/courseviz'], {})
+    """
+
+    src = self.resolve(src)
+    users = self.__read_users__(src, verify=True)
+    dests = filter(lambda d: d != src, sorted(set(map(self.resolve, dests))))
+
+    def copy(dest):
+      try:
+        if set(self.__read_users__(dest, verify=True)) == set(users):
+          return dest, False, None
+        self.set_users(dest, users)
+        if reload:
+          self.reload(dest)
+        return dest, True, None
+      except (IOError, OSError) as e:
+        return dest, False, e
+
+    with self.metrics.track('copy_acl'):
+      pool = ThreadPool(max(1, min(max_workers, len(dests))))
+      try:
+        results = pool.map(copy, dests)
+      finally:
+        pool.close()
+        pool.join()
+
+    return map(lambda (d, c, e): d, filter(lambda (d, c, e): c, results)), \
+      dict(map(lambda (d, c, e): (d, e),
+        filter(lambda (d, c, e): e is not None, results)))
+
+  def expire_due(self, index, now=None):
+    """Removes the grants in ``index`` whose deadline has passed. The
+    removals of each app are combined into a single write. Only the due
+    grants are read from ``index`` and only their apps are opened, so the
+    cost does not depend on the size of the fleet. Grants of apps which
+    could not be written are put back in ``index`` for the next sweep;
+    only those of apps whose directory is gone are dropped.
+
+    :param index: Expiry index, entered as a context manager
+    :type index: :py:class:`shinyacl.ShinyACLExpiry.ShinyACLExpiryIndex`
+    :param now: Optional, current Unix time
+    :type now: ``float``
+    :retval: Mapping of changed apps to the users removed from them
+    :rtype: ``dict``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL, ShinyACLExpiryIndex
+    >>> with ShinyACLExpiryIndex() as index:
+    ...   ShinyACL().expire_due(index)
+    {'/nfs/www/shinyserver/vpal/hello': ['guest@g.harvard.edu']}
+    """
+
+    due = {}
+    for deadline, app, username in index.due(now):
+      due.setdefault(app, []).append((deadline, username))
+
+    expired = {}
+    with self.metrics.track('expire'):
+      for app, grants in sorted(due.iteritems()):
+        if not self.__is_shiny_app__(app):
+          # isdir is also False when the filer fails, so only a missing
+          # directory means the grants are moot.
+          try:
+            self.backend.listdir(app)
+          except OSError as e:
+            if e.errno == errno.ENOENT:
+              self.log.critical("dropped expired users {0} of {1}: {2}".format(
+                ' '.join(map(lambda g: g[1], grants)), app, e))
+              continue
+          self.log.critical(
+            "unable to expire users of {0}: not a shiny app".format(app))
+          for deadline, username in grants:
+            index.add(app, username, deadline)
+          continue
+
+        try:
+          users = self.__read_users__(app, verify=True)
+          removed = filter(lambda u: u in users, map(lambda g: g[1], grants))
+          if removed != []:
+            self.set_users(app, filter(lambda u: u not in removed, users))
+            expired[app] = removed
+        except IOError as e:
+          self.log.critical("unable to expire users of {0}: {1}".format(app, e))
+          for deadline, username in grants:
+            index.add(app, username, deadline)
+
+    return expired
+
   def reload(self,app):
     """Restarts an application by touching a ``restart.txt`` file in the
     application path and changing it's mtime.
@@ -320,6 +921,6 @@ class ShinyACL:
    
     """
  
-    with open('{0}/restart.txt'.format(app), 'a+') as restart_txt:
-      os.utime('{0}/restart.txt'.format(app), None)
+    with self.metrics.track('reload'):
+      self.backend.touch('{0}/restart.txt'.format(app))
     return None    
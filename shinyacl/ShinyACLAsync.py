@@ -0,0 +1,264 @@
+"""
+The ShinyACLAsync module provides an asyncio facade over ``ShinyACL`` for
+embedding ACL management in an event loop driven service. Blocking
+filesystem work is run on a bounded thread pool. Operations on the same
+application are serialized, operations on different applications run
+concurrently.
+
+Uses ``asyncio`` when available and falls back to ``trollius`` and the
+``futures`` backport on Python 2.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+  import asyncio
+except ImportError:
+  import trollius as asyncio
+
+from shinyacl.ShinyACL import ShinyACL
+from shinyacl import ShinyACLNotAShinyApp
+
+class AsyncShinyACL(object):
+  """The AsyncShinyACL class exposes awaitable versions of the
+  ``ShinyACL`` methods. Every method returns an ``asyncio.Future``. All
+  requests share one ``ShinyACL`` object, so the app tree is scanned
+  once, on the first request, instead of once per request.
+  """
+
+  def __init__(self,
+   __root__ = '{0}/shared_space'.format(os.path.expanduser('~')),
+   metrics = None,
+   backend = None,
+   max_workers = 4,
+   loop = None):
+    """AsyncShinyACL class initialization method. Does not touch the
+    filesystem; the app tree is built in the executor on first use.
+
+    :param __root__: Optional, specifies where to look for shared_space
+                     directories
+    :type __root__: ``str``
+    :param metrics: Optional, registry passed on to ``ShinyACL``
+    :type metrics: :py:class:`shinyacl.ShinyACLMetrics.ShinyACLMetrics`
+    :param backend: Optional, filesystem backend passed on to ``ShinyACL``
+    :type backend: :py:class:`shinyacl.ShinyACLBackend.ShinyACLLocalBackend`
+    :param max_workers: Optional, number of threads doing blocking I/O
+    :type max_workers: ``int``
+    :param loop: Optional, event loop. Defaults to the current event loop.
+
+    :Example:
+
+    >>> from shinyacl import AsyncShinyACL
+    >>> acl = AsyncShinyACL('/nfs/home/E/esarmien/shared_space')
+    >>> users = await acl.get_users('/nfs/www/shinyserver/vpal/hello')
+    """
+
+    self.__root__ = __root__
+    self.metrics = metrics
+    self.backend = backend
+    self.executor = ThreadPoolExecutor(max_workers=max_workers)
+    self.loop = loop
+    self.__acl__ = None
+    self.__tails__ = {}
+    self.__resolving__ = None
+
+  def __ready__(self):
+    """Returns a future resolving to the shared ``ShinyACL`` object,
+    building it in the executor on first use. If building fails, the
+    requests waiting for it fail and the next request tries again."""
+
+    if self.loop is None:
+      self.loop = asyncio.get_event_loop()
+
+    if self.__acl__ is None:
+      acl = self.__acl__ = self.loop.run_in_executor(self.executor,
+        partial(ShinyACL, self.__root__, metrics=self.metrics,
+          backend=self.backend))
+
+      def forget(f):
+        if self.__acl__ is f and (f.cancelled() or f.exception() is not None):
+          self.__acl__ = None
+      acl.add_done_callback(forget)
+
+    return self.__acl__
+
+  def __build__(self):
+    acl = ShinyACL(self.__root__, metrics=self.metrics, backend=self.backend)
+    acl.__apps__
+    return acl
+
+  def refresh(self):
+    """Rescans the project spaces and rebuilds the shared app tree, so
+    applications created since the first request can be found. Requests
+    keep using the previous tree until the new one is built, and keep
+    it if building fails.
+
+    :retval: A future resolving to the rebuilt ``ShinyACL`` object
+    :rtype: ``asyncio.Future``
+
+    :Example:
+
+    >>> await acl.refresh()
+    """
+
+    if self.loop is None:
+      self.loop = asyncio.get_event_loop()
+
+    fresh = self.loop.run_in_executor(self.executor, self.__build__)
+
+    def swap(f):
+      if not f.cancelled() and f.exception() is None:
+        self.__acl__ = f
+    fresh.add_done_callback(swap)
+
+    return fresh
+
+  def __schedule__(self, app, fn):
+    """Runs ``fn(acl)`` in the executor once the shared
+    ``ShinyACL`` is ready and, if ``app`` is given, once every earlier
+    operation on ``app`` has finished. ``app`` may be spelled any way
+    ``ShinyACL.resolve`` accepts; operations are serialized on the
+    application it resolves to.
+
+    :param app: Application the operation is serialized on, or ``None``
+    :type app: ``str``
+    :param fn: Blocking function taking a ``ShinyACL`` object
+    :type fn: ``callable``
+    :rtype: ``asyncio.Future``
+    """
+
+    ready = self.__ready__()
+    result = asyncio.Future(loop=self.loop)
+
+    if app is None:
+      ready.add_done_callback(lambda f: self.__enqueue__(None, fn, result))
+      return result
+
+    # Resolve apps one at a time, in the order operations were issued,
+    # so two spellings of one app keep their order on its queue.
+    previous = self.__resolving__ or ready
+    resolved = self.__resolving__ = asyncio.Future(loop=self.loop)
+
+    def release():
+      resolved.set_result(None)
+      if self.__resolving__ is resolved:
+        self.__resolving__ = None
+
+    def enqueue(inner):
+      self.__enqueue__(app if inner.exception() is not None
+        else inner.result(), fn, result)
+      release()
+
+    def resolve(f):
+      if ready.exception() is not None:
+        self.__enqueue__(None, fn, result)
+        release()
+        return
+      self.loop.run_in_executor(self.executor,
+        partial(self.__key__, ready.result(), app)).add_done_callback(enqueue)
+
+    previous.add_done_callback(resolve)
+    return result
+
+  def __key__(self, acl, app):
+    """Returns the full path ``app`` resolves to or, if it is not an
+    application, ``app`` itself so the operation fails with the usual
+    exception."""
+
+    try:
+      return acl.resolve(app)
+    except ShinyACLNotAShinyApp as e:
+      return app
+
+  def __enqueue__(self, key, fn, result):
+    """Runs ``fn(acl)`` in the executor, after every earlier operation
+    on application ``key`` if it is not ``None``, and settles ``result``
+    with its outcome."""
+
+    ready = self.__ready__()
+    after = self.__tails__.get(key, ready) if key is not None else ready
+    gate = asyncio.Future(loop=self.loop)
+
+    def finish(inner):
+      gate.set_result(None)
+      if result.cancelled():
+        return
+      if inner.exception() is not None:
+        result.set_exception(inner.exception())
+      else:
+        result.set_result(inner.result())
+
+    def start(previous):
+      if result.cancelled():
+        gate.set_result(None)
+        return
+      if ready.exception() is not None:
+        gate.set_result(None)
+        result.set_exception(ready.exception())
+        return
+      self.loop.run_in_executor(self.executor,
+        partial(fn, ready.result())).add_done_callback(finish)
+
+    after.add_done_callback(start)
+
+    if key is not None:
+      self.__tails__[key] = gate
+      gate.add_done_callback(lambda g: self.__tails__.pop(key)
+        if self.__tails__.get(key) is g else None)
+
+    return None
+
+  def list_applications(self):
+    """Returns a future resolving to a mapping of project spaces to
+    applications.
+
+    :rtype: ``asyncio.Future``
+    """
+    return self.__schedule__(None, lambda acl: dict(
+      map(lambda (k, v): (k, list(v)), acl.__apps__.iteritems())))
+
+  def get_users(self, app):
+    """Returns a future resolving to the users allowed to access ``app``.
+    See :py:meth:`shinyacl.ShinyACL.ShinyACL.get_users`.
+
+    :rtype: ``asyncio.Future``
+    """
+    return self.__schedule__(app, lambda acl: acl.get_users(app))
+
+  def add_user(self, app, usernames):
+    """See :py:meth:`shinyacl.ShinyACL.ShinyACL.add_user`.
+
+    :rtype: ``asyncio.Future``
+    """
+    return self.__schedule__(app, lambda acl: acl.add_user(app, usernames))
+
+  def del_user(self, app, usernames):
+    """See :py:meth:`shinyacl.ShinyACL.ShinyACL.del_user`.
+
+    :rtype: ``asyncio.Future``
+    """
+    return self.__schedule__(app, lambda acl: acl.del_user(app, usernames))
+
+  def del_all(self, app):
+    """See :py:meth:`shinyacl.ShinyACL.ShinyACL.del_all`.
+
+    :rtype: ``asyncio.Future``
+    """
+    return self.__schedule__(app, lambda acl: acl.del_all(app))
+
+  def reload(self, app):
+    """See :py:meth:`shinyacl.ShinyACL.ShinyACL.reload`.
+
+    :rtype: ``asyncio.Future``
+    """
+    return self.__schedule__(app, lambda acl: acl.reload(app))
+
+  def close(self):
+    """Shuts down the executor once pending operations have finished."""
+    self.executor.shutdown(wait=True)
+    return None
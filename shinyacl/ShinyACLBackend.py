@@ -0,0 +1,263 @@
+"""
+The ShinyACLBackend module provides the filesystem backends used by
+``ShinyACL``. Every filesystem call ``ShinyACL`` makes goes through a
+backend, so the local/NFS filesystem can be swapped for an in-memory
+tree in tests and benchmarks.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+import time
+import errno
+import posixpath
+import threading
+
+class ShinyACLLocalBackend(object):
+  """The default backend, operating on the local (or NFS mounted)
+  filesystem."""
+
+  def listdir(self, path):
+    """Returns the entries of directory ``path``.
+
+    :param path: Fully qualified path to a directory
+    :type path: ``str``
+    :rtype: ``list``
+    :raises: ``OSError``
+    """
+    return os.listdir(path)
+
+  def realpath(self, path):
+    """Returns ``path`` with all symlinks resolved.
+
+    :rtype: ``str``
+    """
+    return os.path.realpath(path)
+
+  def isdir(self, path):
+    """Returns ``True`` if ``path`` is a directory.
+
+    :rtype: ``bool``
+    """
+    return os.path.isdir(path)
+
+  def isfile(self, path):
+    """Returns ``True`` if ``path`` is a regular file.
+
+    :rtype: ``bool``
+    """
+    return os.path.isfile(path)
+
+  def read(self, path):
+    """Returns the contents of file ``path``.
+
+    :rtype: ``str``
+    :raises: ``IOError``
+    """
+    with open(path, 'r') as f:
+      return f.read()
+
+  def write(self, path, data):
+    """Replaces the contents of file ``path`` with ``data``. The new
+    contents are written to a temporary file next to ``path``, with the
+    same permissions and group, which is then renamed over it, so
+    readers never see a truncated file. Falls back to rewriting ``path``
+    in place if it is a symlink, if the directory is not writable or if
+    the group cannot be kept.
+
+    :raises: ``IOError``
+    """
+
+    if os.path.islink(path):
+      return self.__write_in_place__(path, data)
+
+    try:
+      st = os.stat(path)
+    except OSError as e:
+      if e.errno != errno.ENOENT:
+        raise IOError(e.errno, e.strerror, path)
+      st = None
+
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+      f = open(tmp, 'w')
+    except IOError as e:
+      if e.errno != errno.EACCES:
+        raise
+      return self.__write_in_place__(path, data)
+
+    try:
+      with f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+      if st is not None:
+        os.chmod(tmp, st.st_mode & 07777)
+        try:
+          os.chown(tmp, -1, st.st_gid)
+        except OSError:
+          # Not a member of the file's group: renaming would hand the
+          # file to ours and lock the group out.
+          os.unlink(tmp)
+          tmp = None
+      if tmp is not None:
+        os.rename(tmp, path)
+    except (IOError, OSError) as e:
+      os.unlink(tmp)
+      raise IOError(e.errno, e.strerror, path)
+
+    if tmp is None:
+      return self.__write_in_place__(path, data)
+    return None
+
+  def __write_in_place__(self, path, data):
+    with open(path, 'w') as f:
+      f.write(data)
+    return None
+
+  def touch(self, path):
+    """Creates ``path`` if it does not exist and updates its mtime.
+
+    :raises: ``IOError``
+    """
+    with open(path, 'a+'):
+      os.utime(path, None)
+    return None
+
+class ShinyACLMemoryBackend(object):
+  """An in-memory filesystem implementing the same interface as
+  ``ShinyACLLocalBackend``. Used to simulate large project spaces and
+  slow filers without touching disk.
+  """
+
+  def __init__(self, latency=0):
+    """ShinyACLMemoryBackend class initialization method.
+
+    :param latency: Optional, seconds to sleep on every call, or a
+                    ``dict`` mapping a backend method name to seconds,
+                    to simulate NFS round trips
+    :type latency: ``float`` or ``dict``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL, ShinyACLMemoryBackend
+    >>> fs = ShinyACLMemoryBackend(latency={'isfile': 0.002})
+    >>> fs.mkdir('/nfs/www/shinyserver/vpal/hello')
+    >>> fs.write('/nfs/www/shinyserver/vpal/hello/server.R', '')
+    >>> fs.mkdir('/home/esarmien/shared_space')
+    >>> fs.symlink('/nfs/www/shinyserver/vpal',
+    ...   '/home/esarmien/shared_space/vpal')
+    >>> acl = ShinyACL('/home/esarmien/shared_space', backend=fs)
+    """
+
+    self.latency = latency
+    self.calls = {}
+    self.__lock__ = threading.Lock()
+    self.__dirs__ = {'/': []}
+    self.__files__ = {}
+    self.__mtimes__ = {}
+    self.__links__ = {}
+
+  def __delay__(self, method):
+    """Counts a call to ``method`` and sleeps for its injected latency."""
+
+    with self.__lock__:
+      self.calls[method] = self.calls.get(method, 0) + 1
+
+    latency = self.latency.get(method, 0) if isinstance(self.latency, dict) \
+      else self.latency
+    if latency:
+      time.sleep(latency)
+
+  def __resolve__(self, path, depth=0):
+    """Resolves symlinks in ``path`` one component at a time."""
+
+    if depth > 32:
+      raise OSError(errno.ELOOP, os.strerror(errno.ELOOP), path)
+
+    resolved = '/'
+    for component in filter(None, posixpath.normpath(path).split('/')):
+      resolved = posixpath.join(resolved, component)
+      if resolved in self.__links__:
+        resolved = self.__resolve__(posixpath.join(
+          posixpath.dirname(resolved), self.__links__[resolved]), depth + 1)
+    return resolved
+
+  def __entry__(self, path):
+    """Registers ``path`` as an entry of its parent directory."""
+
+    parent, name = posixpath.split(path)
+    if parent not in self.__dirs__:
+      raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), parent)
+    if path not in self.__dirs__ and path not in self.__files__ and \
+      path not in self.__links__:
+      self.__dirs__[parent].append(name)
+
+  def mkdir(self, path):
+    """Creates directory ``path`` and any missing parents."""
+
+    path = self.__resolve__(path)
+    if path in self.__dirs__:
+      return None
+    self.mkdir(posixpath.dirname(path))
+    self.__entry__(path)
+    self.__dirs__[path] = []
+    return None
+
+  def symlink(self, target, path):
+    """Creates a symlink at ``path`` pointing to ``target``."""
+
+    path = posixpath.normpath(path)
+    self.__entry__(path)
+    self.__links__[path] = target
+    return None
+
+  def getmtime(self, path):
+    """Returns the mtime of file ``path``."""
+
+    return self.__mtimes__[self.__resolve__(path)]
+
+  def listdir(self, path):
+    self.__delay__('listdir')
+    path = self.__resolve__(path)
+    if path not in self.__dirs__:
+      raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    return list(self.__dirs__[path])
+
+  def realpath(self, path):
+    self.__delay__('realpath')
+    return self.__resolve__(path)
+
+  def isdir(self, path):
+    self.__delay__('isdir')
+    return self.__resolve__(path) in self.__dirs__
+
+  def isfile(self, path):
+    self.__delay__('isfile')
+    return self.__resolve__(path) in self.__files__
+
+  def read(self, path):
+    self.__delay__('read')
+    path = self.__resolve__(path)
+    if path not in self.__files__:
+      raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    return self.__files__[path]
+
+  def write(self, path, data):
+    self.__delay__('write')
+    path = self.__resolve__(path)
+    with self.__lock__:
+      self.__entry__(path)
+      self.__files__[path] = data
+      self.__mtimes__[path] = time.time()
+    return None
+
+  def touch(self, path):
+    self.__delay__('touch')
+    path = self.__resolve__(path)
+    with self.__lock__:
+      self.__entry__(path)
+      self.__files__.setdefault(path, '')
+      self.__mtimes__[path] = time.time()
+    return None
@@ -0,0 +1,240 @@
+"""
+The ShinyACLCatalog module keeps applications, users and grants in an
+indexed SQLite database. When ``ShinyACL`` is given a catalog, it answers
+reads from the catalog and writes each application's ``.shiny_app.conf``
+from it, so fleet-wide questions like who has access to what become
+indexed lookups instead of opening every file on the filer.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import time
+import hashlib
+import sqlite3
+import threading
+from shinyacl.ShinyACLExceptions import ShinyACLCatalogIncomplete
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS apps (
+  id INTEGER PRIMARY KEY,
+  path TEXT UNIQUE NOT NULL,
+  project TEXT NOT NULL,
+  conf_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS apps_project ON apps (project);
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY,
+  name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS grants (
+  app_id INTEGER NOT NULL REFERENCES apps (id) ON DELETE CASCADE,
+  user_id INTEGER NOT NULL REFERENCES users (id),
+  position INTEGER NOT NULL,
+  PRIMARY KEY (app_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS grants_user ON grants (user_id);
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+"""
+
+def conf_hash(data):
+  """Returns the content hash stored for a ``.shiny_app.conf`` file, or
+  ``None`` if the file does not exist.
+
+  :param data: Contents of the file, ``None`` if it does not exist
+  :type data: ``str``
+  :rtype: ``str``
+  """
+
+  return None if data is None else hashlib.sha1(data).hexdigest()
+
+class ShinyACLCatalog(object):
+  """The ShinyACLCatalog class wraps the SQLite catalog. It is safe to
+  share one catalog between threads."""
+
+  def __init__(self, path):
+    """ShinyACLCatalog class initialization method. Creates the schema
+    if the database is new.
+
+    :param path: Location of the SQLite database, or ``:memory:``
+    :type path: ``str``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL, ShinyACLCatalog
+    >>> acl = ShinyACL(catalog=ShinyACLCatalog('/var/lib/rshiny_acl/acl.db'))
+    """
+
+    self.path = path
+    self.__lock__ = threading.Lock()
+    self.__db__ = sqlite3.connect(path, check_same_thread=False)
+    self.__db__.text_factory = str
+    self.__db__.execute('PRAGMA foreign_keys = ON')
+    self.__db__.executescript(CATALOG_SCHEMA)
+
+  def get_users(self, app):
+    """Returns the users granted access to ``app``, in ACL order, or
+    ``None`` if ``app`` is not in the catalog.
+
+    :param app: Fully qualified path to application directory
+    :type app: ``str``
+    :rtype: ``list``
+    """
+
+    with self.__lock__:
+      if self.__db__.execute('SELECT 1 FROM apps WHERE path = ?',
+        (app,)).fetchone() is None:
+        return None
+
+      return map(lambda row: row[0], self.__db__.execute("""
+        SELECT users.name FROM grants
+        JOIN apps ON apps.id = grants.app_id
+        JOIN users ON users.id = grants.user_id
+        WHERE apps.path = ? ORDER BY grants.position""", (app,)))
+
+  def get_hash(self, app):
+    """Returns the content hash of ``app``'s ``.shiny_app.conf`` as of
+    the last time the catalog wrote or imported it.
+
+    :rtype: ``str``
+    """
+
+    with self.__lock__:
+      row = self.__db__.execute('SELECT conf_hash FROM apps WHERE path = ?',
+        (app,)).fetchone()
+    return None if row is None else row[0]
+
+  def set_users(self, app, project, usernames, hash):
+    """Replaces the grants of ``app`` with ``usernames`` and records the
+    content hash of the ``.shiny_app.conf`` file materialized for them.
+
+    :param app: Fully qualified path to application directory
+    :type app: ``str``
+    :param project: Fully qualified path to the app's project space
+    :type project: ``str``
+    :param usernames: Users granted access, in ACL order
+    :type usernames: ``list``
+    :param hash: Content hash of the app's ``.shiny_app.conf``
+    :type hash: ``str``
+    """
+
+    with self.__lock__:
+      with self.__db__:
+        self.__db__.execute("""
+          INSERT OR IGNORE INTO apps (path, project) VALUES (?, ?)""",
+          (app, project))
+        self.__db__.execute("""
+          UPDATE apps SET project = ?, conf_hash = ? WHERE path = ?""",
+          (project, hash, app))
+        app_id = self.__db__.execute('SELECT id FROM apps WHERE path = ?',
+          (app,)).fetchone()[0]
+
+        self.__db__.execute('DELETE FROM grants WHERE app_id = ?', (app_id,))
+        self.__db__.executemany(
+          'INSERT OR IGNORE INTO users (name) VALUES (?)',
+          map(lambda u: (u,), usernames))
+        self.__db__.executemany("""
+          INSERT OR IGNORE INTO grants (app_id, user_id, position)
+          SELECT ?, id, ? FROM users WHERE name = ?""",
+          map(lambda (position, u): (app_id, position, u),
+            enumerate(usernames)))
+
+    return None
+
+  def apps(self, project=None):
+    """Returns the cataloged apps, optionally only those of ``project``.
+
+    :rtype: ``list``
+    """
+
+    with self.__lock__:
+      if project is None:
+        rows = self.__db__.execute('SELECT path FROM apps ORDER BY path')
+      else:
+        rows = self.__db__.execute(
+          'SELECT path FROM apps WHERE project = ? ORDER BY path', (project,))
+      return map(lambda row: row[0], rows)
+
+  def delete_apps(self, apps):
+    """Removes ``apps`` and their grants from the catalog.
+
+    :param apps: Fully qualified paths to application directories
+    :type apps: ``list``
+    """
+
+    with self.__lock__:
+      with self.__db__:
+        self.__db__.executemany('DELETE FROM apps WHERE path = ?',
+          map(lambda app: (app,), apps))
+
+    return None
+
+  def imported(self):
+    """Returns the Unix time every app was last imported or verified
+    at, or ``None`` if that never happened.
+
+    :rtype: ``float``
+    """
+
+    with self.__lock__:
+      row = self.__db__.execute(
+        "SELECT value FROM meta WHERE key = 'imported'").fetchone()
+    return None if row is None else float(row[0])
+
+  def set_imported(self, now=None):
+    """Records that every app has been imported or verified."""
+
+    with self.__lock__:
+      with self.__db__:
+        self.__db__.execute(
+          "INSERT OR REPLACE INTO meta (key, value) VALUES ('imported', ?)",
+          (str(time.time() if now is None else now),))
+
+    return None
+
+  def who_has_access(self, username):
+    """Returns the apps ``username`` is granted access to. Apps are
+    only imported as they are read, so this requires every app to have
+    been imported once, see ``ShinyACL.verify_catalog``.
+
+    :param username: E-mail address or HUID
+    :type username: ``str``
+    :rtype: ``list``
+    :raises:
+      :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLCatalogIncomplete`
+
+    :Example:
+
+    >>> catalog.who_has_access('dtingley@g.harvard.edu')
+    ['/nfs/www/shinyserver/vpal/hello']
+    """
+
+    if self.imported() is None:
+      raise ShinyACLCatalogIncomplete(self.path)
+
+    with self.__lock__:
+      return map(lambda row: row[0], self.__db__.execute("""
+        SELECT apps.path FROM grants
+        JOIN apps ON apps.id = grants.app_id
+        JOIN users ON users.id = grants.user_id
+        WHERE users.name = ? ORDER BY apps.path""", (username,)))
+
+  def count_by_project(self):
+    """Returns ``(project space, apps, grants)`` tuples.
+
+    :rtype: ``list``
+    """
+
+    with self.__lock__:
+      return self.__db__.execute("""
+        SELECT apps.project, COUNT(DISTINCT apps.id), COUNT(grants.user_id)
+        FROM apps LEFT JOIN grants ON grants.app_id = apps.id
+        GROUP BY apps.project ORDER BY apps.project""").fetchall()
+
+  def close(self):
+    with self.__lock__:
+      self.__db__.close()
+    return None
@@ -0,0 +1,105 @@
+"""
+The ShinyACLCheck module validates usernames and finds the problems
+hand edits and interrupted writes leave in ``.shiny_app.conf`` files:
+several ``required_user`` lines, a line not terminated by ``;``, an
+indented line, duplicate users and users which are neither an e-mail
+address nor an HUID. It also computes the repaired contents of such a
+file.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import re
+
+EMAIL_REGEX = re.compile("^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+HUID_REGEX = re.compile("^[0-9]{8}$")
+
+# Lines ShinyACL reads users from, and lines which look like they were
+# meant to be one.
+REQUIRED_USER_REGEX = re.compile('^required_user.*;$')
+REQUIRED_USER_LIKE_REGEX = re.compile('^\s*required_user(\s|;|$)')
+
+MULTIPLE_REQUIRED_USER = 'multiple-required-user'
+MISSING_SEMICOLON = 'missing-semicolon'
+INDENTED_REQUIRED_USER = 'indented-required-user'
+DUPLICATE_USER = 'duplicate-user'
+INVALID_USER = 'invalid-user'
+PROBLEMS = (MULTIPLE_REQUIRED_USER, MISSING_SEMICOLON, INDENTED_REQUIRED_USER,
+            DUPLICATE_USER, INVALID_USER)
+
+def valid_username(username):
+  """Returns ``True`` if ``username`` is an e-mail address or an HUID.
+
+  :rtype: ``bool``
+  """
+
+  return EMAIL_REGEX.match(username) is not None or \
+    HUID_REGEX.match(username) is not None
+
+def check_conf(data):
+  """Returns the problems found in ``.shiny_app.conf`` contents
+  ``data`` and the repaired contents. Lines are read as
+  ``ShinyACL.get_users`` reads them, so ``\r\n`` endings are fine but
+  a line with a missing ``;`` or leading whitespace grants nobody. The
+  repaired file keeps the users ``get_users`` reports, minus duplicates
+  and invalid users, on a single line in place of the first
+  ``required_user`` line. Other lines are kept as they are.
+
+  :param data: Contents of a ``.shiny_app.conf`` file
+  :type data: ``str``
+  :retval: Sorted list of problems, and repaired contents or ``None``
+           if there are no problems
+  :rtype: ``tuple``
+
+  :Example:
+
+  >>> from shinyacl.ShinyACLCheck import check_conf
+  >>> check_conf('required_user a@a.com a@a.com;\\n')
+  (['duplicate-user'], 'required_user a@a.com;\\n')
+  """
+
+  lines = data.splitlines(True)
+  stripped = data.splitlines()
+  indexes = filter(lambda i: REQUIRED_USER_LIKE_REGEX.match(stripped[i]),
+    range(len(lines)))
+
+  if indexes == []:
+    return [], None
+
+  problems = set()
+  if len(indexes) > 1:
+    problems.add(MULTIPLE_REQUIRED_USER)
+
+  if filter(lambda i: not stripped[i].endswith(';'), indexes):
+    problems.add(MISSING_SEMICOLON)
+  if filter(lambda i: stripped[i] != stripped[i].lstrip(), indexes):
+    problems.add(INDENTED_REQUIRED_USER)
+
+  effective = filter(lambda i: REQUIRED_USER_REGEX.match(stripped[i]),
+    indexes)
+  users = []
+  if effective != []:
+    users = filter(lambda u: u != '',
+      stripped[effective[0]].rstrip()[:-1].split(' ')[1:])
+
+  kept = []
+  for user in users:
+    if not valid_username(user):
+      problems.add(INVALID_USER)
+    elif user in kept:
+      problems.add(DUPLICATE_USER)
+    else:
+      kept.append(user)
+
+  if not problems:
+    return [], None
+
+  repaired = map(lambda i: None if i in indexes else lines[i],
+    range(len(lines)))
+  repaired[indexes[0]] = 'required_user {0};{1}'.format(' '.join(kept),
+    lines[indexes[0]][len(stripped[indexes[0]]):] or '\n')
+  repaired = filter(lambda l: l is not None, repaired)
+  repaired = map(lambda l: l if l.endswith('\n') else l + '\n', repaired)
+
+  return sorted(problems), ''.join(repaired)
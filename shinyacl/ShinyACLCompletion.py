@@ -0,0 +1,117 @@
+"""
+The ShinyACLCompletion module maintains the index shell completion for
+``rshiny_acl`` is served from. The index is a plain text file with one
+line per app::
+
+  <path>\\t<project>/<app>\\t<user> <user> ...
+
+The completion scripts shipped in ``completion/`` read it directly, so a
+keystroke costs a read of one local file and never starts Python or
+touches the filer. When the index is older than its time to live, the
+scripts serve it anyway and run ``rshiny_acl --refresh-completion`` in
+the background.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+import time
+import fcntl
+
+COMPLETION_TTL = 300
+
+def completion_cache_path():
+  """Returns the location of the completion index: ``$SHINYACL_COMPLETION``
+  or ``rshiny_acl/completion`` in ``$XDG_CACHE_HOME`` (``~/.cache``).
+
+  :rtype: ``str``
+  """
+
+  return os.environ.get('SHINYACL_COMPLETION', os.path.join(
+    os.environ.get('XDG_CACHE_HOME',
+      os.path.join(os.path.expanduser('~'), '.cache')),
+    'rshiny_acl', 'completion'))
+
+class ShinyACLCompletionCache(object):
+  """The ShinyACLCompletionCache class writes and reads the completion
+  index."""
+
+  def __init__(self, path=None):
+    """ShinyACLCompletionCache class initialization method.
+
+    :param path: Optional, location of the index, defaults to
+                 :py:func:`completion_cache_path`
+    :type path: ``str``
+    """
+
+    self.path = completion_cache_path() if path is None else path
+
+  def is_stale(self, ttl=COMPLETION_TTL, now=None):
+    """Returns whether the index is missing or older than ``ttl``
+    seconds.
+
+    :rtype: ``bool``
+    """
+
+    try:
+      mtime = os.path.getmtime(self.path)
+    except OSError:
+      return True
+    return (time.time() if now is None else now) - mtime > ttl
+
+  def invalidate(self):
+    """Marks the index stale, so the next completion refreshes it, but
+    keeps serving it until then. Called after an ACL changes."""
+
+    try:
+      os.utime(self.path, (0, 0))
+    except OSError:
+      pass
+    return None
+
+  def refresh(self, acl):
+    """Rebuilds the index from the ACL of every app of ``acl`` and
+    replaces it atomically. Returns ``None`` without doing anything if
+    another refresh is already running.
+
+    :param acl: ``ShinyACL`` to index
+    :type acl: :py:class:`shinyacl.ShinyACL.ShinyACL`
+    :retval: Number of apps indexed
+    :rtype: ``int``
+    """
+
+    directory = os.path.dirname(self.path)
+    if directory and not os.path.isdir(directory):
+      os.makedirs(directory, 0700)
+
+    with open('{0}.lock'.format(self.path), 'a') as lock:
+      try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except IOError:
+        return None
+
+      inventory = acl.inventory()
+      tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+      with open(tmp, 'w') as index:
+        for app in inventory:
+          index.write('{0}\t{1}/{2}\t{3}\n'.format(app,
+            os.path.basename(os.path.dirname(app)), os.path.basename(app),
+            ' '.join(inventory.get_users(app))))
+      os.rename(tmp, self.path)
+
+      return len(inventory)
+
+  def read(self):
+    """Returns ``(path, project/app, users)`` for every indexed app, or
+    an empty list if there is no index.
+
+    :rtype: ``list``
+    """
+
+    try:
+      with open(self.path, 'r') as index:
+        return map(lambda (path, name, users): (path, name, users.split()),
+          map(lambda l: l.rstrip('\n').split('\t'), index))
+    except IOError:
+      return []
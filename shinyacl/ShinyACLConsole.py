@@ -9,18 +9,43 @@ from shinyacl import ShinyACL, \
 ShinyACLUserAlreadyExists, \
 ShinyACLUserDoesNotExist, \
 ShinyACLNotAShinyApp, \
-ShinyACLNotAValidEmail
+ShinyACLNotAValidEmail, \
+ShinyACLInvalidExpiry, \
+ShinyACLCatalogIncomplete, \
+ShinyACLMetrics, \
+ShinyACLCatalog, \
+ShinyACLExpiryIndex, \
+ShinyACLCompletionCache, \
+ShinyACLScheduler
+from shinyacl.ShinyACLExpiry import parse_expiry
+from shinyacl.ShinyACLScheduler import parse_io_limits
 from argparse import ArgumentParser
+from itertools import islice
+import os
+import re
+import sys
+import json
+import time
+import signal
 
 class ShinyACLConsole:
   def __init__(self):
-    """This simply initiates a ``ShinyACL`` object."""
-    self.acl = ShinyACL()
+    """This simply initiates the ``ShinyACLMetrics`` registry. The
+    ``ShinyACL`` object recording into it is created by ``run``, once
+    the I/O limits and catalog are known."""
+    self.metrics = ShinyACLMetrics()
+    self.acl = None
 
-  def list_applications(self):
-    """Prints a tabulated list of applications belonging to user."""
+  def list_applications(self, project=None, pattern=None, regex=None,
+    sort='path', limit=None, format='text'):
+    """Prints a tabulated list of applications belonging to user,
+    optionally filtered as in
+    :py:meth:`shinyacl.ShinyACL.ShinyACL.find_applications`. Unless
+    sorted by name, applications are printed as they are discovered.
+    ``format`` is ``text``, ``tsv`` (project space and application per
+    line) or ``json`` (one object per line)."""
 
-    if self.acl.__apps__ == {}:
+    if self.acl.__project_spaces__ == []:
 
       print u'\u274C   {0}'.format("You currently have no rShiny\
  projects defined in your ~/shared_space.\n    If you were recently added\
@@ -29,13 +54,30 @@ class ShinyACLConsole:
  rce_services@help.hmdc.harvard.edu")
       return None
 
-    for key, value in self.acl.__apps__.iteritems():
-      print """\
+    if sort == 'name':
+      apps = self.acl.find_applications(project, pattern, regex, sort, limit)
+    else:
+      apps = islice(self.acl.discover(project, pattern, regex), limit)
+
+    # Consecutive apps of the same project space share one section.
+    section = None
+    for projectspace, app in apps:
+      if format == 'json':
+        print json.dumps({'project': projectspace, 'app': app})
+      elif format == 'tsv':
+        print '{0}\t{1}'.format(projectspace, app)
+      else:
+        if projectspace != section:
+          print """\
 Project space: {0}
-{1}
-{2}""".format(key,
-              '-' * len('Project space: {0}'.format(key)),
-              '\n'.join(value))
+{1}""".format(projectspace,
+            '-' * len('Project space: {0}'.format(projectspace)))
+        print app
+      section = projectspace
+      sys.stdout.flush()
+
+    if section is None and format == 'text':
+      print u'\u274C   No applications matched.'
 
     return None
 
@@ -43,6 +85,7 @@ Project space: {0}
     """Lists users for a specified application, gathered from CLI
     input."""
 
+    app = self.acl.resolve(app)
     print """\
 {0}
 {1}
@@ -50,6 +93,161 @@ Project space: {0}
   (lambda users: "No users currently configured.\n" if users == [] else '\n'.join(users))(
     self.acl.get_users(app)))
 
+  def who_has_access(self, username):
+    """Lists the applications a user has access to, from the catalog."""
+
+    try:
+      apps = self.acl.catalog.who_has_access(username)
+    except ShinyACLCatalogIncomplete as e:
+      print u'\u274C   {0}'.format(e)
+      return None
+
+    print """\
+{0}
+{1}
+{2}""".format(username, '-'*len(username),
+  "No applications." if apps == [] else '\n'.join(apps))
+
+  def verify_catalog(self, resync):
+    """Reports applications whose ``.shiny_app.conf`` was edited outside
+    of the catalog and prints per project space totals."""
+
+    drifted = self.acl.verify_catalog(resync)
+
+    for app in drifted:
+      if app not in self.acl.__apps__.get(os.path.dirname(app), []):
+        print u'\u274C   {0} no longer exists{1}'.format(app,
+          ', removed' if resync else '')
+        continue
+      print u'\u274C   {0} was modified outside the catalog{1}'.format(app,
+        ', re-imported' if resync else '')
+
+    for project, apps, grants in self.acl.catalog.count_by_project():
+      print '{0}: {1} applications, {2} grants'.format(project, apps, grants)
+
+    if drifted == []:
+      print u'\u2705   Catalog is consistent'
+
+  def schedule_expiry(self, path, app, usernames, deadline):
+    """Records that ``usernames`` lose access to ``app`` at ``deadline``
+    or, when ``deadline`` is ``None``, forgets any earlier deadline of
+    theirs. Forgetting does not create the expiry index."""
+
+    if deadline is None and not os.path.exists(path):
+      return None
+
+    with ShinyACLExpiryIndex(path) as index:
+      if deadline is None:
+        index.discard(app, usernames)
+      else:
+        for username in usernames:
+          index.add(app, username, deadline)
+
+    return None
+
+  def copy_expiry(self, path, src, apps):
+    """Replaces the deadlines of ``apps`` with those of ``src``, so
+    users granted access to ``src`` until a deadline lose access to
+    ``apps`` at the same time."""
+
+    if not os.path.exists(path):
+      return None
+
+    with ShinyACLExpiryIndex(path) as index:
+      deadlines = filter(lambda (d, a, u): a == src, index.pending())
+      for app in apps:
+        index.discard(app)
+        for deadline, _, username in deadlines:
+          index.add(app, username, deadline)
+
+    return None
+
+  def expire_due(self, path):
+    """Removes grants whose deadline has passed and reloads each changed
+    application once."""
+
+    if not os.path.exists(path):
+      print u'\u2705   No grants are scheduled to expire'
+      return None
+
+    with ShinyACLExpiryIndex(path) as index:
+      expired = self.acl.expire_due(index)
+      remaining = len(index)
+
+    for app, users in sorted(expired.iteritems()):
+      print u'\u2705   Expired user(s) {0} from {1}'.format(
+        ' '.join(users), app)
+      try:
+        self.acl.reload(app)
+        print u'\u2705   Reloaded {0}'.format(app)
+      except IOError as e:
+        print u'\u274C   {0}'.format(e)
+
+    print u'\u2705   Expired grants on {0} application(s), {1} grant(s)\
+ still scheduled'.format(len(expired), remaining)
+
+  def copy_acl(self, path, src, dests, project=None, pattern=None,
+    regex=None, max_workers=8):
+    """Copies the ACL of ``src`` to ``dests`` or, when ``dests`` is
+    empty, to every other application of the project spaces matching
+    ``project``. Only changed applications are written and reloaded."""
+
+    src = self.acl.resolve(src)
+    if dests == []:
+      dests = map(lambda (projectspace, app): app,
+        self.acl.find_applications(project, pattern, regex))
+
+    dests = set(map(self.acl.resolve, dests)) - set([src])
+    changed, failed = self.acl.copy_acl(src, dests, max_workers)
+
+    for app in changed:
+      print u'\u2705   Copied users of {0} to {1}'.format(src, app)
+    self.copy_expiry(path, src, changed)
+
+    for app, e in sorted(failed.iteritems()):
+      print u'\u274C   {0}: {1}'.format(app, e)
+
+    print u'\u2705   Updated and reloaded {0} application(s), {1}\
+ already up to date'.format(len(changed),
+      len(dests) - len(changed) - len(failed))
+
+  def check(self, repair, max_workers=8):
+    """Reports, and with ``repair`` repairs, ``.shiny_app.conf`` files
+    with problems and prints totals per problem."""
+
+    problems, failed = self.acl.check(repair, max_workers)
+    broken = sorted(filter(lambda app: problems[app], problems.keys()))
+
+    for app in broken:
+      print u'\u274C   {0}: {1}'.format(app, ', '.join(problems[app]))
+      if repair and app not in failed:
+        print u'\u2705   Repaired and reloaded {0}'.format(app)
+
+    for app, e in sorted(failed.iteritems()):
+      print u'\u274C   {0}: {1}'.format(app, e)
+
+    totals = {}
+    for app in broken:
+      for problem in problems[app]:
+        totals[problem] = totals.get(problem, 0) + 1
+
+    print u'{0}   Checked {1} application(s): {2} with problems{3}{4}'.format(
+      u'\u2705' if (broken == [] or repair) and failed == {} else u'\u274C',
+      len(problems), len(broken),
+      ''.join(map(lambda (p, n): ', {0} {1}'.format(n, p),
+        sorted(totals.iteritems()))),
+      ', {0} repaired'.format(len(set(broken) - set(failed))) if repair else '')
+
+  def refresh_completion(self):
+    """Rebuilds the shell completion index."""
+
+    apps = ShinyACLCompletionCache().refresh(self.acl)
+
+    if apps is None:
+      print u'\u2705   The completion index is already being refreshed'
+    else:
+      print u'\u2705   Indexed {0} application(s) for completion'.format(apps)
+
   def del_user(self, app, user):
     """Deletes a user based on CLI input"""
     return self.acl.del_user(app, user)
@@ -93,10 +291,227 @@ address or HUID to access a specified application.')
      metavar='RShinyApplicationPath',
      help='Removes all user permissions for a specified application.')
 
+    group.add_argument('--copy-acl',
+     type=str,
+     nargs='+',
+     metavar=('SourceApplication', 'DestinationApplications'),
+     help='Gives the specified applications, or with --project every other\
+ application of the matching project spaces, the same users as the source\
+ application. Only applications whose users differ are written and\
+ reloaded.')
+
+    group.add_argument('--who-has-access',
+     type=str,
+     metavar='UserEmail',
+     help='Lists applications a user has access to. Requires --catalog,\
+ fully imported by --catalog-check.')
+
+    group.add_argument('--catalog-check',
+     action='store_true',
+     help='Imports applications missing from the catalog and reports\
+ applications whose .shiny_app.conf was edited outside of it, or which\
+ no longer exist. Requires --catalog.')
+
+    group.add_argument('--expire-due',
+     action='store_true',
+     help='Removes users whose access granted with --expires has ended.')
+
+    group.add_argument('--check',
+     action='store_true',
+     help='Checks the .shiny_app.conf of every application for several\
+ required_user lines, a missing trailing ;, duplicate users and invalid\
+ users.')
+
+    group.add_argument('--refresh-completion',
+     action='store_true',
+     help='Rebuilds the index shell completion is served from. The\
+ completion script runs this in the background when the index is stale.')
+
+    parser.add_argument('--expires',
+     type=str,
+     metavar='Date',
+     help='With --add-user, removes the users again at the next\
+ --expire-due after this local date (YYYY-MM-DD, through the end of the\
+ day) or time (YYYY-MM-DDTHH:MM).')
+
+    parser.add_argument('--expiry-index',
+     type=str,
+     metavar='Path',
+     default=os.environ.get('SHINYACL_EXPIRY_INDEX',
+       '{0}/.rshiny_acl_expiries'.format(os.path.expanduser('~'))),
+     help='Location of the index of expiring grants. Defaults to\
+ $SHINYACL_EXPIRY_INDEX or ~/.rshiny_acl_expiries.')
+
+    parser.add_argument('--repair',
+     action='store_true',
+     help='With --check, rewrites each .shiny_app.conf with problems once,\
+ keeping the users rshiny_acl --list-users reports minus duplicate and\
+ invalid ones, and reloads its application.')
+
+    parser.add_argument('--resync',
+     action='store_true',
+     help='With --catalog-check, re-imports edited applications from their\
+ .shiny_app.conf and removes applications which no longer exist.')
+
+    parser.add_argument('--catalog',
+     type=str,
+     metavar='SQLiteDatabase',
+     default=os.environ.get('SHINYACL_CATALOG'),
+     help='Answers queries from, and writes .shiny_app.conf files through,\
+ an SQLite ACL catalog. Defaults to $SHINYACL_CATALOG.')
+
+    parser.add_argument('--project',
+     type=str,
+     metavar='ProjectSpace',
+     help='With --list-applications or --copy-acl, only list or update\
+ applications in project spaces whose name or path matches this glob.')
+
+    parser.add_argument('--match',
+     type=str,
+     metavar='Glob',
+     help='With --list-applications or --copy-acl, only list or update\
+ applications whose directory name matches this glob.')
+
+    parser.add_argument('--regex',
+     type=str,
+     metavar='RegularExpression',
+     help='With --list-applications or --copy-acl, only list or update\
+ applications whose directory name matches this regular expression.')
+
+    parser.add_argument('--sort',
+     choices=['path', 'name'],
+     default='path',
+     help='With --list-applications, order applications by path (default)\
+ or by directory name.')
+
+    parser.add_argument('--limit',
+     type=int,
+     metavar='N',
+     help='With --list-applications, list at most N applications.')
+
+    parser.add_argument('--workers',
+     type=int,
+     metavar='N',
+     default=8,
+     help='With --copy-acl or --check, works on at most N applications at a\
+ time. Defaults to 8.')
+
+    parser.add_argument('--format',
+     choices=['text', 'tsv', 'json'],
+     default='text',
+     help='With --list-applications, prints sections per project space\
+ (default), tab separated project space and application lines, or one JSON\
+ object per line.')
+
+    parser.add_argument('--io-rate',
+     type=str,
+     metavar='Limits',
+     default=os.environ.get('SHINYACL_IO_RATE'),
+     help='Maximum filesystem calls per second, either one number or\
+ comma separated class=number pairs for the meta, read, write and reload\
+ classes, e.g. meta=500,read=200,write=20,reload=5. Defaults to\
+ $SHINYACL_IO_RATE, unlimited if unset.')
+
+    parser.add_argument('--io-concurrency',
+     type=str,
+     metavar='Limits',
+     default=os.environ.get('SHINYACL_IO_CONCURRENCY'),
+     help='Maximum filesystem calls in flight, as for --io-rate. Defaults\
+ to $SHINYACL_IO_CONCURRENCY, unlimited if unset.')
+
+    parser.add_argument('--io-latency',
+     type=float,
+     metavar='Seconds',
+     default=os.environ.get('SHINYACL_IO_LATENCY'),
+     help='Lowers the --io-rate of a class while its filesystem calls take\
+ longer than this on average, and raises it back once they are faster.\
+ Defaults to $SHINYACL_IO_LATENCY.')
+
+    parser.add_argument('--metrics-file',
+     type=str,
+     metavar='PromFile',
+     default=os.environ.get('SHINYACL_METRICS_FILE'),
+     help='Writes operation metrics to a node_exporter textfile collector\
+ file. Defaults to $SHINYACL_METRICS_FILE.')
+
     args = parser.parse_args()
 
+    deadline = None
+    if args.repair and not args.check:
+      parser.error('--repair can only be used with --check')
+
+    if args.limit is not None and args.limit < 0:
+      parser.error('--limit must not be negative')
+
+    if args.workers < 1:
+      parser.error('--workers must be at least 1')
+
+    if args.expires:
+      if not args.add_user:
+        parser.error('--expires can only be used with --add-user')
+      try:
+        deadline = parse_expiry(args.expires)
+      except ShinyACLInvalidExpiry as e:
+        parser.error(str(e))
+
+    try:
+      rates = parse_io_limits(args.io_rate)
+      concurrency = parse_io_limits(args.io_concurrency, int)
+    except ValueError as e:
+      parser.error('invalid I/O limits: {0}'.format(e))
+
+    scheduler = None
+    if rates or concurrency:
+      scheduler = ShinyACLScheduler(rates, concurrency, args.io_latency,
+        self.metrics)
+    elif args.io_latency is not None:
+      parser.error('--io-latency requires --io-rate')
+
+    catalog = None
+    if args.catalog:
+      catalog = ShinyACLCatalog(args.catalog)
+    elif args.who_has_access or args.catalog_check:
+      parser.error('--catalog or $SHINYACL_CATALOG is required')
+
+    self.acl = ShinyACL(metrics=self.metrics, catalog=catalog,
+      scheduler=scheduler)
+
     if args.list_applications:
-      self.list_applications()
+      # Exit quietly, and stop scanning, when the reader of a pipe like
+      # | head goes away.
+      signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+      try:
+        self.list_applications(args.project, args.match, args.regex,
+          args.sort, args.limit, args.format)
+      except re.error as e:
+        print u'\u274C   Invalid regular expression {0}: {1}'.format(
+          args.regex, e)
+    elif args.copy_acl:
+      if len(args.copy_acl) == 1 and not args.project:
+        parser.error('--copy-acl needs destination applications or --project')
+      try:
+        self.copy_acl(args.expiry_index, args.copy_acl[0], args.copy_acl[1:],
+          args.project, args.match, args.regex, args.workers)
+      except ShinyACLNotAShinyApp as e:
+        print e
+      except re.error as e:
+        print u'\u274C   Invalid regular expression {0}: {1}'.format(
+          args.regex, e)
+      except IOError as e:
+        print u'\u274C   {0}'.format(e)
+    elif args.who_has_access:
+      self.who_has_access(args.who_has_access)
+    elif args.catalog_check:
+      self.verify_catalog(args.resync)
+    elif args.expire_due:
+      self.expire_due(args.expiry_index)
+    elif args.check:
+      self.check(args.repair, args.workers)
+    elif args.refresh_completion:
+      try:
+        self.refresh_completion()
+      except (IOError, OSError) as e:
+        print u'\u274C   {0}'.format(e)
     elif args.list_users:
       try:
         self.list_users_for_application(args.list_users)
@@ -106,11 +521,14 @@ address or HUID to access a specified application.')
         print "No such application {0} available or permission\
  denied\n{1}".format(args.list_users, e)
     elif args.add_user:
+      # Users are added one at a time so that, when one fails, those
+      # already written still get their deadline and a reload.
+      added = []
       try:
-        self.acl.add_user(args.add_user[0], args.add_user[1:])
-        print u'\u2705   Successfully added user(s) {0} to {1}'.format(
-          ' '.join(args.add_user[1:]).encode('utf-8'),
-          args.add_user[0].encode('utf-8'))
+        app = self.acl.resolve(args.add_user[0])
+        for username in args.add_user[1:]:
+          self.acl.add_user(app, [username])
+          added.append(username)
       except ShinyACLNotAShinyApp as e:
         print e
       except ShinyACLUserAlreadyExists as e:
@@ -119,35 +537,64 @@ address or HUID to access a specified application.')
         print u'\u274C   {0}'.format(e)
       except IOError as e:
         print u'\u274C   {0}'.format(e)
-      else:
-        self.acl.reload(args.add_user[0])
+
+      if added:
+        print u'\u2705   Successfully added user(s) {0} to {1}'.format(
+          ' '.join(added).encode('utf-8'),
+          app.encode('utf-8'))
+        try:
+          self.schedule_expiry(args.expiry_index, app, added, deadline)
+        except IOError as e:
+          print u'\u274C   {0}'.format(e)
+        else:
+          if deadline is not None:
+            print u'\u2705   Access expires {0}'.format(
+              time.strftime('%Y-%m-%d %H:%M', time.localtime(deadline)))
+        self.acl.reload(app)
         print u'\u2705   Reloaded shiny-server'
     elif args.del_all:
       try:
-        self.acl.del_all(args.del_all)
+        app = self.acl.resolve(args.del_all)
+        self.acl.del_all(app)
         print u'\u2705   Successfully removed all users from {0}'.format(
-          args.del_all.encode('utf-8'))
+          app.encode('utf-8'))
+        self.schedule_expiry(args.expiry_index, app, None, None)
       except ShinyACLNotAShinyApp as e:
         print e
       except IOError as e:
         print u'\u274C   {0}'.format(e)
       else:
-        self.acl.reload(args.del_all)
+        self.acl.reload(app)
         print u'\u2705   Reloaded shiny-server'
     elif args.del_user:
       try:
-        self.acl.del_user(args.del_user[0], args.del_user[1:])
+        app = self.acl.resolve(args.del_user[0])
+        self.acl.del_user(app, args.del_user[1:])
         print u'\u2705   Successfully removed user(s) {0} from {1}'.format(
           ' '.join(args.del_user[1:]).encode('utf-8'),
-          args.del_user[0].encode('utf-8'))
+          app.encode('utf-8'))
+        self.schedule_expiry(args.expiry_index, app,
+          args.del_user[1:], None)
+      except ShinyACLNotAShinyApp as e:
+        print e
       except ShinyACLUserDoesNotExist as e:
         print u'\u274C   {0}'.format(e)
       except IOError as e:
         print u'\u274C   {0}'.format(e)
       else:
-        self.acl.reload(args.del_user[0])
+        self.acl.reload(app)
         print u'\u2705   Reloaded shiny server'
 
+    if args.add_user or args.del_user or args.del_all or args.copy_acl or \
+      args.expire_due or args.repair:
+      ShinyACLCompletionCache().invalidate()
+
+    if args.metrics_file:
+      try:
+        self.metrics.write(args.metrics_file)
+      except (IOError, OSError) as e:
+        print u'\u274C   Unable to write metrics: {0}'.format(e)
+
     return 0
 
       
@@ -19,9 +19,19 @@ class ShinyACLUserDoesNotExist(Exception):
      return 'No such user {0} in access control list for app {1}'.format(self.user,self.app)
 
 class ShinyACLNotAShinyApp(Exception):
-   def __init__(self, appdir):
+   def __init__(self, appdir, suggestions=None):
      self.appdir = appdir
+     self.suggestions = suggestions or []
    def __str__(self):
+     if self.suggestions != []:
+       return """\
+Error
+-----
+   {0} is not an RShiny application available to you.
+Did you mean
+------------
+   {1}""".format(self.appdir, '\n   '.join(self.suggestions))
+
      return """\
 Error
 -----
@@ -31,6 +41,25 @@ Troubleshooting
 ----------------
    Is there a server.R file present within this directory?
    Run the following command to list applications available to you:
-      shiny_acl.py --list-applications
+      rshiny_acl --list-applications
    Do you have the proper groups assigned to your username?
    For assistance, email rce_services@help.hmdc.harvard.edu""".format(self.appdir)
+
+class ShinyACLInvalidExpiry(Exception):
+   def __init__(self, value):
+     self.value = value
+   def __str__(self):
+     return '{0} is not a valid expiry. Use a future date as YYYY-MM-DD or YYYY-MM-DDTHH:MM.'.format(self.value)
+
+class ShinyACLConfModified(IOError):
+   def __init__(self, app):
+     IOError.__init__(self)
+     self.app = app
+   def __str__(self):
+     return '{0}/.shiny_app.conf was modified outside the catalog. Its users were re-imported, please retry.'.format(self.app)
+
+class ShinyACLCatalogIncomplete(Exception):
+   def __init__(self, path):
+     self.path = path
+   def __str__(self):
+     return 'The catalog {0} has not imported every application yet. Run rshiny_acl --catalog-check first.'.format(self.path)
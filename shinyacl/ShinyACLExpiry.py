@@ -0,0 +1,171 @@
+"""
+The ShinyACLExpiry module keeps track of time-limited grants. Deadlines
+are kept in a sidecar file ordered as a binary heap, so a sweep only
+pops the grants which are due and never has to open every
+``.shiny_app.conf`` on the filer.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+import time
+import fcntl
+import heapq
+from datetime import datetime, timedelta
+from shinyacl import ShinyACLInvalidExpiry
+
+EXPIRY_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M',
+                  '%Y-%m-%d')
+
+def parse_expiry(value, now=None):
+  """Returns the Unix time a grant given ``--expires value`` ends at. A
+  bare date grants access through the end of that day.
+
+  :param value: Local date or date and time
+  :type value: ``str``
+  :param now: Optional, current Unix time
+  :type now: ``float``
+  :rtype: ``int``
+  :raises:
+    :py:exc:`shinyacl.ShinyACLExceptions.ShinyACLInvalidExpiry`
+
+  :Example:
+
+  >>> from shinyacl.ShinyACLExpiry import parse_expiry
+  >>> parse_expiry('2016-08-31T17:00')
+  1472677200
+  """
+
+  for fmt in EXPIRY_FORMATS:
+    try:
+      deadline = datetime.strptime(value, fmt)
+    except ValueError:
+      continue
+
+    if fmt == '%Y-%m-%d':
+      deadline += timedelta(days=1)
+
+    deadline = int(time.mktime(deadline.timetuple()))
+    if deadline <= (time.time() if now is None else now):
+      raise ShinyACLInvalidExpiry(value)
+    return deadline
+
+  raise ShinyACLInvalidExpiry(value)
+
+class ShinyACLExpiryIndex(object):
+  """The ShinyACLExpiryIndex class is a priority queue of
+  ``(deadline, app, username)`` grants persisted in a sidecar file. Use
+  it as a context manager: the file is locked and loaded on entry, and
+  written back atomically on a clean exit.
+  """
+
+  def __init__(self, path = '{0}/.rshiny_acl_expiries'.format(
+    os.path.expanduser('~'))):
+    """ShinyACLExpiryIndex class initialization method.
+
+    :param path: Optional, location of the sidecar file
+    :type path: ``str``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACLExpiryIndex
+    >>> with ShinyACLExpiryIndex() as index:
+    ...   index.add('/nfs/www/shinyserver/vpal/hello',
+    ...     'esarmien@g.harvard.edu', 1472677200)
+    """
+
+    self.path = path
+    self.__heap__ = []
+    self.__lock__ = None
+
+  def __enter__(self):
+    self.__lock__ = open('{0}.lock'.format(self.path), 'a')
+    fcntl.flock(self.__lock__, fcntl.LOCK_EX)
+
+    try:
+      with open(self.path, 'r') as sidecar:
+        self.__heap__ = map(lambda l: (lambda (d, a, u): (int(d), a, u))(
+          l.rstrip('\n').split('\t')), filter(lambda l: l.strip(), sidecar))
+    except IOError:
+      self.__heap__ = []
+
+    # Saved in heap order already; heapify guards against hand edits.
+    heapq.heapify(self.__heap__)
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    try:
+      if exc_type is None:
+        self.save()
+    finally:
+      fcntl.flock(self.__lock__, fcntl.LOCK_UN)
+      self.__lock__.close()
+      self.__lock__ = None
+    return False
+
+  def __len__(self):
+    return len(self.__heap__)
+
+  def save(self):
+    """Atomically writes the index back to its sidecar file."""
+
+    tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+    with open(tmp, 'w') as sidecar:
+      sidecar.writelines(map(lambda (d, a, u): '{0}\t{1}\t{2}\n'.format(d, a, u),
+        self.__heap__))
+    os.rename(tmp, self.path)
+    return None
+
+  def add(self, app, username, deadline):
+    """Schedules ``username``'s access to ``app`` to end at
+    ``deadline``, replacing an earlier deadline for the same grant.
+
+    :param app: Fully qualified path to application directory
+    :type app: ``str``
+    :param username: E-mail address or HUID
+    :type username: ``str``
+    :param deadline: Unix time the grant ends at
+    :type deadline: ``int``
+    """
+
+    self.discard(app, [username])
+    heapq.heappush(self.__heap__, (int(deadline), app, username))
+    return None
+
+  def discard(self, app, usernames=None):
+    """Forgets the deadlines of ``usernames`` on ``app``, or of every
+    user of ``app`` when ``usernames`` is ``None``. Used when a grant is
+    removed or made permanent before it expires.
+    """
+
+    heap = filter(lambda (d, a, u): a != app or
+      (usernames is not None and u not in usernames), self.__heap__)
+
+    if len(heap) != len(self.__heap__):
+      heapq.heapify(heap)
+      self.__heap__ = heap
+    return None
+
+  def due(self, now=None):
+    """Pops and returns the grants whose deadline has passed, earliest
+    first. Costs ``O(k log n)`` for ``k`` due grants.
+
+    :param now: Optional, current Unix time
+    :type now: ``float``
+    :rtype: ``list``
+    """
+
+    now = time.time() if now is None else now
+    expired = []
+    while self.__heap__ and self.__heap__[0][0] <= now:
+      expired.append(heapq.heappop(self.__heap__))
+    return expired
+
+  def pending(self):
+    """Returns every scheduled ``(deadline, app, username)``, earliest
+    first.
+
+    :rtype: ``list``
+    """
+    return sorted(self.__heap__)
@@ -0,0 +1,127 @@
+"""
+The ShinyACLIndex module provides the lookup index ``ShinyACL`` uses to
+resolve short application names, like ``project/app1`` or ``app1``, to
+fully qualified application paths and to suggest the nearest
+applications when a path is not an application.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+from array import array
+
+def trigrams(key):
+  """Returns the set of trigrams of ``key``, padded so that matching
+  beginnings and ends of names weigh more.
+
+  :rtype: ``set``
+  """
+
+  padded = '^{0}$'.format(key.lower())
+  return set(map(lambda i: padded[i:i + 3], range(max(len(padded) - 2, 1))))
+
+class ShinyACLAppIndex(object):
+  """The ShinyACLAppIndex class indexes apps by directory name and by the
+  trigrams of their project-relative name (``project/app``). Apps are
+  referred to by integer ids; names are shared with the app tree rather
+  than copied.
+  """
+
+  __slots__ = ('projects', 'project_of', 'app_names', 'names', 'grams')
+
+  def __init__(self):
+    self.projects = []
+    self.project_of = array('I')
+    self.app_names = []
+    self.names = {}
+    self.grams = {}
+
+  def add(self, project):
+    """Adds the apps of a project space to the index.
+
+    :param project: Apps of one project space
+    :type project: :py:class:`shinyacl.ShinyACLInventory.ShinyACLProject`
+    """
+
+    projectid = len(self.projects)
+    self.projects.append(project.path)
+    projectname = os.path.basename(project.path)
+
+    for name in project.names:
+      appid = len(self.app_names)
+      self.project_of.append(projectid)
+      self.app_names.append(name)
+      self.names.setdefault(name, array('I')).append(appid)
+      for gram in trigrams('{0}/{1}'.format(projectname, name)):
+        self.grams.setdefault(gram, array('I')).append(appid)
+
+    return None
+
+  def __path__(self, appid):
+    return os.path.join(self.projects[self.project_of[appid]],
+      self.app_names[appid])
+
+  def __key__(self, appid):
+    return '{0}/{1}'.format(
+      os.path.basename(self.projects[self.project_of[appid]]),
+      self.app_names[appid])
+
+  def lookup(self, name):
+    """Returns the apps ``name`` may refer to, as a project-relative name
+    or as an app directory name.
+
+    :param name: ``project/app`` or ``app``
+    :type name: ``str``
+    :rtype: ``list``
+    """
+
+    parts = name.strip('/').split('/')
+    if len(parts) > 2:
+      return []
+
+    ids = self.names.get(parts[-1], [])
+    if len(parts) == 2:
+      ids = filter(lambda appid: os.path.basename(
+        self.projects[self.project_of[appid]]) == parts[0], ids)
+
+    return map(self.__path__, ids)
+
+  def suggest(self, query, limit=3):
+    """Returns up to ``limit`` apps whose project-relative names are the
+    most similar to ``query``, by trigram similarity.
+
+    :param query: Path or name which is not an app
+    :type query: ``str``
+    :param limit: Optional, number of suggestions
+    :type limit: ``int``
+    :rtype: ``list``
+    """
+
+    # Compare like with like: the last two path components with
+    # project-relative names, a bare name with app directory names.
+    query = '/'.join(query.rstrip('/').split('/')[-2:])
+    grams = trigrams(query)
+    key = self.__key__ if '/' in query else self.app_names.__getitem__
+
+    # Trigrams shared by a large part of the fleet, like those of
+    # "app" or of a project name, select almost everything; draw the
+    # candidates from the rarest ones only.
+    postings = sorted(map(lambda g: self.grams.get(g, ()), grams), key=len)
+    rare = filter(lambda p: 0 < len(p) <= max(256, len(self.app_names) / 50),
+      postings) or filter(None, postings)[:1]
+
+    candidates = set()
+    for posting in rare:
+      candidates.update(posting)
+
+    scores = {}
+    for appid in candidates:
+      keygrams = trigrams(key(appid))
+      shared = len(grams & keygrams)
+      scores[appid] = float(shared) / (len(grams) + len(keygrams) - shared)
+
+    ranked = sorted(filter(lambda appid: scores[appid] >= 0.3, scores.keys()),
+      key=lambda appid: (-scores[appid], self.__key__(appid)))
+
+    return map(self.__path__, ranked[:limit])
@@ -0,0 +1,174 @@
+"""
+The ShinyACLInventory module holds the compact in-memory representation
+of the app tree and of the ACLs of every app. Apps are stored as names
+relative to their project space, and users as integer codes into a
+shared table. An inventory of tens of thousands of apps therefore does
+not repeat the same path prefixes and usernames over and over.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+from array import array
+from bisect import bisect_left
+
+class ShinyACLProject(object):
+  """The apps of one project space. Behaves like the sorted list of
+  fully qualified app paths it replaces, but stores the project space
+  path once and only the app directory names per app.
+  """
+
+  __slots__ = ('path', 'names')
+
+  def __init__(self, path, names):
+    """ShinyACLProject class initialization method.
+
+    :param path: Fully qualified path to the project space
+    :type path: ``str``
+    :param names: App directory names
+    :type names: ``list``
+    """
+
+    self.path = path
+    self.names = tuple(sorted(map(
+      lambda n: intern(n) if type(n) is str else n, names)))
+
+  def __len__(self):
+    return len(self.names)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return map(lambda n: os.path.join(self.path, n), self.names[index])
+    return os.path.join(self.path, self.names[index])
+
+  def __iter__(self):
+    for name in self.names:
+      yield os.path.join(self.path, name)
+
+  def index(self, app):
+    """Returns the position of fully qualified ``app`` in this project
+    space, or ``-1``."""
+
+    parent, name = os.path.split(app)
+    if parent != self.path:
+      return -1
+
+    index = bisect_left(self.names, name)
+    if index < len(self.names) and self.names[index] == name:
+      return index
+    return -1
+
+  def __contains__(self, app):
+    return self.index(app) >= 0
+
+  def __eq__(self, other):
+    return list(self) == list(other)
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return repr(list(self))
+
+class ShinyACLUsers(object):
+  """A table assigning each distinct username a small integer code, so
+  the username is kept in memory once however many apps grant it."""
+
+  __slots__ = ('codes', 'names')
+
+  def __init__(self):
+    self.codes = {}
+    self.names = []
+
+  def code(self, username):
+    """Returns the code of ``username``, assigning one if it is new.
+
+    :rtype: ``int``
+    """
+
+    code = self.codes.get(username)
+    if code is None:
+      code = self.codes[username] = len(self.names)
+      self.names.append(username)
+    return code
+
+  def __len__(self):
+    return len(self.names)
+
+class ShinyACLInventory(object):
+  """The ACL of every app in a set of project spaces, as returned by
+  :py:meth:`shinyacl.ShinyACL.ShinyACL.inventory`. Grants are stored as
+  ``array('I')`` of user codes, in one list per project space indexed
+  like its ``ShinyACLProject``. The projects themselves are shared with
+  the app tree and are not modified.
+  """
+
+  __slots__ = ('projects', 'users', '__grants__')
+
+  def __init__(self, projects):
+    """ShinyACLInventory class initialization method.
+
+    :param projects: Mapping of project space paths to
+                     ``ShinyACLProject``, usually ``ShinyACL.__apps__``
+    :type projects: ``dict``
+    """
+
+    self.projects = projects
+    self.users = ShinyACLUsers()
+
+    self.__grants__ = dict(map(lambda (path, project):
+      (path, [None] * len(project)), projects.iteritems()))
+
+  def __locate__(self, app):
+    project = self.projects.get(os.path.dirname(app))
+    index = -1 if project is None else project.index(app)
+    if index < 0:
+      raise KeyError(app)
+    return project, index
+
+  def __contains__(self, app):
+    project = self.projects.get(os.path.dirname(app))
+    return project is not None and app in project
+
+  def __iter__(self):
+    """Yields every fully qualified app path."""
+
+    for path in sorted(self.projects.keys()):
+      for app in self.projects[path]:
+        yield app
+
+  def __len__(self):
+    return sum(map(len, self.projects.itervalues()))
+
+  def set_users(self, app, usernames):
+    """Records ``usernames`` as the ACL of ``app``.
+
+    :raises: ``KeyError`` if ``app`` is not in the inventory
+    """
+
+    project, index = self.__locate__(app)
+    self.__grants__[project.path][index] = array('I', map(self.users.code, usernames))
+    return None
+
+  def get_users(self, app):
+    """Returns the ACL of ``app``, or ``None`` if it was not loaded.
+
+    :rtype: ``list``
+    :raises: ``KeyError`` if ``app`` is not in the inventory
+    """
+
+    project, index = self.__locate__(app)
+    grants = self.__grants__[project.path][index]
+    if grants is None:
+      return None
+    return map(self.users.names.__getitem__, grants)
+
+  def grants(self):
+    """Returns the total number of grants loaded.
+
+    :rtype: ``int``
+    """
+
+    return sum(map(lambda p: sum(map(lambda g: 0 if g is None else len(g),
+      p)), self.__grants__.itervalues()))
@@ -0,0 +1,300 @@
+"""
+The ShinyACLMetrics module collects counters, gauges and latency
+histograms for ACL operations and writes them in the node_exporter
+textfile collector format.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import os
+import re
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS_HELP = {
+  'shinyacl_operations_total':
+    ('counter', 'Number of ShinyACL operations performed.'),
+  'shinyacl_operation_duration_seconds':
+    ('histogram', 'Latency of ShinyACL operations in seconds.'),
+  'shinyacl_exceptions_total':
+    ('counter', 'Number of exceptions raised by ShinyACL operations.'),
+  'shinyacl_project_apps':
+    ('gauge', 'Number of rShiny applications in a project space.'),
+  'shinyacl_app_users':
+    ('gauge', 'Number of users in the ACL of an rShiny application.'),
+  'shinyacl_conf_problems':
+    ('gauge', 'Number of .shiny_app.conf files with a problem, as of the\
+ last check.'),
+  'shinyacl_io_wait_seconds_total':
+    ('counter', 'Seconds filesystem calls waited for the I/O scheduler.'),
+  'shinyacl_io_rate':
+    ('gauge', 'Filesystem calls per second admitted by the I/O scheduler\
+ after latency adjustments.'),
+  'shinyacl_last_run_timestamp_seconds':
+    ('gauge', 'Unix time at which these metrics were last written.'),
+}
+
+SAMPLE_REGEX = re.compile(
+  r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)$')
+
+def __labelstring__(labels):
+  """Renders a label tuple as a Prometheus label string. ``le`` is
+  always rendered last."""
+
+  if not labels:
+    return ''
+
+  return '{{{0}}}'.format(','.join(
+    map(lambda (k, v): '{0}="{1}"'.format(k,
+      str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')),
+      sorted(labels, key=lambda (k, v): (k == 'le', k)))))
+
+def __labels__(labels):
+  return tuple(sorted((labels or {}).items()))
+
+def __samplekey__(sample):
+  """Sort key for ``((name, labels), value)`` items which orders
+  histogram buckets by their numeric upper bound."""
+
+  (name, labels), value = sample
+  match = re.search(r',?le="([^"]*)"', labels)
+  if match is None:
+    return (name, labels, 0.0)
+  return (name, labels.replace(match.group(0), ''), float(match.group(1)))
+
+def __float__(value):
+  return '+Inf' if value == float('inf') else repr(float(value))
+
+class ShinyACLMetrics(object):
+  """The ShinyACLMetrics class is a small, thread safe metrics registry.
+  A ``ShinyACL`` object records discovery, ``get_users``, write and
+  reload operations into it; ``write`` persists the registry for the
+  node_exporter textfile collector.
+  """
+
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    """ShinyACLMetrics class initialization method.
+
+    :param buckets: Optional, upper bounds of histogram buckets in
+                    seconds
+    :type buckets: ``tuple``
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL, ShinyACLMetrics
+    >>> metrics = ShinyACLMetrics()
+    >>> acl = ShinyACL(metrics=metrics)
+    """
+
+    self.buckets = tuple(sorted(buckets))
+    self.__lock__ = threading.Lock()
+    self.__counters__ = {}
+    self.__gauges__ = {}
+    self.__histograms__ = {}
+
+  def inc(self, name, labels=None, value=1):
+    """Increments counter ``name`` by ``value``."""
+
+    key = (name, __labels__(labels))
+    with self.__lock__:
+      self.__counters__[key] = self.__counters__.get(key, 0) + value
+
+  def set(self, name, value, labels=None):
+    """Sets gauge ``name`` to ``value``."""
+
+    with self.__lock__:
+      self.__gauges__[(name, __labels__(labels))] = value
+
+  def observe(self, name, value, labels=None):
+    """Records ``value`` in histogram ``name``."""
+
+    key = (name, __labels__(labels))
+    with self.__lock__:
+      if key not in self.__histograms__:
+        self.__histograms__[key] = [[0] * len(self.buckets), 0.0, 0]
+      histogram = self.__histograms__[key]
+      for index, bound in enumerate(self.buckets):
+        if value <= bound:
+          histogram[0][index] += 1
+      histogram[1] += value
+      histogram[2] += 1
+
+  @contextmanager
+  def track(self, operation):
+    """Context manager which counts and times ``operation``. Exceptions
+    raised inside the block are counted by type and re-raised.
+
+    :param operation: Name of the operation, e.g. ``get_users``
+    :type operation: ``str``
+
+    :Example:
+
+    >>> with metrics.track('reload'):
+    ...   acl.reload('/nfs/www/shinyserver/vpal/hello')
+    """
+
+    start = time.time()
+    error = None
+    try:
+      yield
+    except Exception as e:
+      error = e
+      raise
+    finally:
+      self.record(operation, time.time() - start, error)
+
+  def record(self, operation, seconds, exception=None):
+    """Counts ``operation`` and records its latency, like ``track``,
+    for operations whose time is not spent in a single block.
+
+    :param operation: Name of the operation, e.g. ``discovery``
+    :type operation: ``str``
+    :param seconds: Time the operation took
+    :type seconds: ``float``
+    :param exception: Optional, exception the operation raised
+    :type exception: ``Exception``
+    """
+
+    if exception is not None:
+      self.inc('shinyacl_exceptions_total',
+        {'operation': operation, 'exception': type(exception).__name__})
+    self.inc('shinyacl_operations_total', {'operation': operation})
+    self.observe('shinyacl_operation_duration_seconds', seconds,
+      {'operation': operation})
+
+  def __samples__(self):
+    """Returns a mapping of metric family to a list of
+    ``(sample name, label string, value)`` tuples."""
+
+    families = {}
+
+    with self.__lock__:
+      for (name, labels), value in self.__counters__.iteritems():
+        families.setdefault(name, []).append(
+          (name, __labelstring__(labels), value))
+
+      for (name, labels), value in self.__gauges__.iteritems():
+        families.setdefault(name, []).append(
+          (name, __labelstring__(labels), value))
+
+      for (name, labels), (counts, total, count) in \
+        self.__histograms__.iteritems():
+        samples = families.setdefault(name, [])
+        for bound, bucket in zip(self.buckets, counts):
+          samples.append(('{0}_bucket'.format(name),
+            __labelstring__(labels + (('le', __float__(bound)),)), bucket))
+        samples.append(('{0}_bucket'.format(name),
+          __labelstring__(labels + (('le', '+Inf'),)), count))
+        samples.append(('{0}_sum'.format(name),
+          __labelstring__(labels), total))
+        samples.append(('{0}_count'.format(name),
+          __labelstring__(labels), count))
+
+    return families
+
+  def render(self, previous=None):
+    """Returns the registry in Prometheus text exposition format.
+    Counter and histogram samples found in ``previous`` are added to the
+    values of this registry. Other samples in ``previous``, such as
+    gauges, are dropped; only the gauges of this registry are written.
+
+    :param previous: Optional, contents of a previously written metrics
+                     file
+    :type previous: ``str``
+    :rtype: ``str``
+    """
+
+    families = {}
+    types = dict(map(lambda (k, v): (k, v[0]), METRICS_HELP.iteritems()))
+    family = None
+
+    for line in (previous or '').splitlines():
+      if line.startswith('# TYPE '):
+        family, kind = line.split()[2:4]
+        types[family] = kind
+        continue
+      match = SAMPLE_REGEX.match(line)
+      if line.startswith('#') or match is None or family is None:
+        continue
+      if types.get(family) not in ('counter', 'histogram'):
+        continue
+      name, labels, value = match.groups()
+      try:
+        families.setdefault(family, {})[(name, labels or '')] = \
+          float(value)
+      except ValueError:
+        continue
+
+    for family, samples in self.__samples__().iteritems():
+      merged = families.setdefault(family, {})
+      for name, labels, value in samples:
+        merged[(name, labels)] = merged.get((name, labels), 0) + value
+
+    lines = []
+    for family in sorted(families.keys()):
+      kind, description = METRICS_HELP.get(family,
+        (types.get(family, 'untyped'), family))
+      lines.append('# HELP {0} {1}'.format(family, description))
+      lines.append('# TYPE {0} {1}'.format(family, kind))
+      for (name, labels), value in sorted(families[family].items(),
+        key=__samplekey__):
+        lines.append('{0}{1} {2}'.format(name, labels, __float__(value)))
+
+    return '\n'.join(lines) + '\n'
+
+  def write(self, path):
+    """Atomically writes the registry to ``path``, accumulating counters
+    and histograms from the metrics file left by previous runs. The file
+    is written to a temporary file in the same directory and renamed so
+    the textfile collector never reads a partial file.
+
+    :param path: Location of the ``.prom`` file, usually inside the
+                 node_exporter textfile collector directory
+    :type path: ``str``
+
+    :Example:
+
+    >>> metrics.write('/var/lib/node_exporter/textfile/rshiny_acl.prom')
+    """
+
+    self.set('shinyacl_last_run_timestamp_seconds', time.time())
+
+    with open('{0}.lock'.format(path), 'a') as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      try:
+        try:
+          with open(path, 'r') as previous:
+            data = previous.read()
+        except IOError:
+          data = None
+
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as prom:
+          prom.write(self.render(data))
+          prom.flush()
+          os.fsync(prom.fileno())
+        os.chmod(tmp, 0644)
+        os.rename(tmp, path)
+      finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return None
+
+class ShinyACLNullMetrics(ShinyACLMetrics):
+  """A metrics registry which discards everything. Used by ``ShinyACL``
+  when no registry is supplied."""
+
+  def inc(self, name, labels=None, value=1):
+    return None
+
+  def set(self, name, value, labels=None):
+    return None
+
+  def observe(self, name, value, labels=None):
+    return None
@@ -0,0 +1,295 @@
+"""
+The ShinyACLScheduler module paces the filesystem calls ``ShinyACL``
+makes, so whole-fleet operations do not flood the shared filer. Calls
+fall into four classes, each with its own rate and in-flight limits:
+
+* ``meta``: ``listdir``, ``realpath``, ``isdir`` and ``isfile``
+* ``read``: reads of ``.shiny_app.conf`` files
+* ``write``: writes of ``.shiny_app.conf`` files
+* ``reload``: touches of ``restart.txt``, each restarting an app
+
+With a target latency, the rate of a class is halved whenever the
+observed latency of its calls rises above the target, and raised again,
+a step at a time up to the configured rate, while it stays below.
+"""
+
+__author__ = "Evan Sarmiento"
+__email__ = "esarmien@g.harvard.edu"
+
+import time
+import threading
+from contextlib import contextmanager
+from shinyacl.ShinyACLMetrics import ShinyACLNullMetrics
+
+IO_CLASSES = ('meta', 'read', 'write', 'reload')
+
+# Rates are adjusted at most once per interval, by halving or by this
+# fraction of the configured rate, and never below the configured rate
+# divided by MIN_RATE_DIVISOR.
+ADJUST_INTERVAL = 1.0
+INCREASE_STEP = 0.1
+MIN_RATE_DIVISOR = 32.0
+LATENCY_SMOOTHING = 0.2
+
+def parse_io_limits(value, cast=float):
+  """Parses an ``--io-rate`` or ``--io-concurrency`` value, either a
+  single number applying to every class or comma separated
+  ``class=number`` pairs.
+
+  :param value: e.g. ``200`` or ``meta=500,write=20,reload=5``
+  :type value: ``str``
+  :param cast: Optional, type of the numbers
+  :type cast: ``type``
+  :rtype: ``dict``
+  :raises: ``ValueError``
+
+  :Example:
+
+  >>> from shinyacl.ShinyACLScheduler import parse_io_limits
+  >>> parse_io_limits('meta=500,reload=5')
+  {'meta': 500.0, 'reload': 5.0}
+  """
+
+  if value is None:
+    return {}
+
+  if '=' not in value:
+    limit = cast(value)
+    if limit <= 0:
+      raise ValueError('limits must be positive: {0}'.format(value))
+    return dict(map(lambda c: (c, limit), IO_CLASSES))
+
+  limits = {}
+  for pair in value.split(','):
+    ioclass, _, limit = pair.partition('=')
+    ioclass = ioclass.strip()
+    if ioclass not in IO_CLASSES:
+      raise ValueError('unknown I/O class {0}, expected one of {1}'.format(
+        ioclass, ', '.join(IO_CLASSES)))
+    limits[ioclass] = cast(limit)
+    if limits[ioclass] <= 0:
+      raise ValueError('limits must be positive: {0}'.format(pair))
+  return limits
+
+class ShinyACLTokenBucket(object):
+  """A token bucket admitting ``rate`` calls per second on average and
+  bursts of up to ``burst`` calls. Safe to share between threads;
+  callers are admitted in the order they asked."""
+
+  def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+    """ShinyACLTokenBucket class initialization method.
+
+    :param rate: Calls per second
+    :type rate: ``float``
+    :param burst: Optional, bucket size, defaults to one second of calls
+    :type burst: ``float``
+    """
+
+    self.rate = float(rate)
+    self.burst = float(max(1, rate if burst is None else burst))
+    self.__tokens__ = self.burst
+    self.__clock__ = clock
+    self.__sleep__ = sleep
+    self.__last__ = clock()
+    self.__lock__ = threading.Lock()
+
+  def __refill__(self, now):
+    self.__tokens__ = min(self.burst,
+      self.__tokens__ + (now - self.__last__) * self.rate)
+    self.__last__ = now
+
+  def set_rate(self, rate):
+    """Changes the rate calls are admitted at from now on."""
+
+    with self.__lock__:
+      self.__refill__(self.__clock__())
+      self.rate = float(rate)
+    return None
+
+  def acquire(self):
+    """Takes a token, sleeping until one is available.
+
+    :retval: Seconds slept
+    :rtype: ``float``
+    """
+
+    with self.__lock__:
+      self.__refill__(self.__clock__())
+      # Reserve the token now, so concurrent callers queue up behind
+      # each other instead of all waking up at once.
+      self.__tokens__ -= 1
+      wait = 0.0 if self.__tokens__ >= 0 else -self.__tokens__ / self.rate
+
+    if wait > 0:
+      self.__sleep__(wait)
+    return wait
+
+class ShinyACLScheduler(object):
+  """The ShinyACLScheduler class admits filesystem calls according to
+  per class rate and in-flight limits, adapting rates to the latency
+  the filer shows. Share one scheduler between every ``ShinyACL`` and
+  thread of a process to hold them to one budget.
+  """
+
+  def __init__(self, rates=None, concurrency=None, target_latency=None,
+    metrics=None, clock=time.time, sleep=time.sleep):
+    """ShinyACLScheduler class initialization method. Classes without a
+    limit are not limited.
+
+    :param rates: Optional, calls per second per I/O class
+    :type rates: ``dict``
+    :param concurrency: Optional, calls in flight per I/O class
+    :type concurrency: ``dict``
+    :param target_latency: Optional, seconds of average call latency
+                           above which rates are lowered
+    :type target_latency: ``float``
+    :param metrics: Optional, registry which records time spent waiting
+                    and the current rates
+    :type metrics: :py:class:`shinyacl.ShinyACLMetrics.ShinyACLMetrics`
+
+    :Example:
+
+    >>> from shinyacl import ShinyACL, ShinyACLScheduler
+    >>> acl = ShinyACL(scheduler=ShinyACLScheduler(
+    ...   rates={'meta': 500, 'read': 200, 'write': 20, 'reload': 5},
+    ...   concurrency={'meta': 16, 'read': 8}, target_latency=0.05))
+    """
+
+    rates = rates or {}
+    concurrency = concurrency or {}
+
+    self.target_latency = target_latency
+    self.metrics = ShinyACLNullMetrics() if metrics is None else metrics
+    self.__clock__ = clock
+    self.__lock__ = threading.Lock()
+    self.__rates__ = dict(filter(lambda (c, r): r is not None, rates.items()))
+    self.__buckets__ = dict(map(lambda (c, r): (c,
+      ShinyACLTokenBucket(r, clock=clock, sleep=sleep)),
+      self.__rates__.items()))
+    self.__in_flight__ = dict(map(lambda (c, n): (c, threading.Semaphore(n)),
+      filter(lambda (c, n): n is not None, concurrency.items())))
+    self.__latency__ = {}
+    self.__adjusted__ = {}
+
+  def rate(self, ioclass):
+    """Returns the current rate of ``ioclass``, or ``None`` if it is
+    not limited.
+
+    :rtype: ``float``
+    """
+
+    bucket = self.__buckets__.get(ioclass)
+    return None if bucket is None else bucket.rate
+
+  @contextmanager
+  def slot(self, ioclass):
+    """Context manager admitting one call of ``ioclass`` and measuring
+    its latency.
+
+    :param ioclass: One of ``IO_CLASSES``
+    :type ioclass: ``str``
+
+    :Example:
+
+    >>> with scheduler.slot('read'):
+    ...   data = open('/nfs/www/shinyserver/vpal/hello/.shiny_app.conf').read()
+    """
+
+    semaphore = self.__in_flight__.get(ioclass)
+    bucket = self.__buckets__.get(ioclass)
+
+    if semaphore is not None:
+      semaphore.acquire()
+    try:
+      if bucket is not None:
+        wait = bucket.acquire()
+        if wait > 0:
+          self.metrics.inc('shinyacl_io_wait_seconds_total',
+            {'class': ioclass}, wait)
+      start = self.__clock__()
+      try:
+        yield
+      finally:
+        self.__observe__(ioclass, self.__clock__() - start)
+    finally:
+      if semaphore is not None:
+        semaphore.release()
+
+  def __observe__(self, ioclass, latency):
+    """Folds ``latency`` into the average latency of ``ioclass`` and
+    adjusts its rate: halved above the target latency, raised a step
+    below it."""
+
+    bucket = self.__buckets__.get(ioclass)
+    if self.target_latency is None or bucket is None:
+      return None
+
+    with self.__lock__:
+      average = self.__latency__.get(ioclass, latency)
+      average += LATENCY_SMOOTHING * (latency - average)
+      self.__latency__[ioclass] = average
+
+      now = self.__clock__()
+      if now - self.__adjusted__.get(ioclass, 0) < ADJUST_INTERVAL:
+        return None
+
+      configured = self.__rates__[ioclass]
+      if average > self.target_latency:
+        rate = max(configured / MIN_RATE_DIVISOR, bucket.rate / 2)
+      else:
+        rate = min(configured, bucket.rate + configured * INCREASE_STEP)
+
+      self.__adjusted__[ioclass] = now
+      if rate != bucket.rate:
+        bucket.set_rate(rate)
+        self.metrics.set('shinyacl_io_rate', rate, {'class': ioclass})
+
+    return None
+
+class ShinyACLThrottledBackend(object):
+  """A backend passing every call to ``backend`` through a
+  ``ShinyACLScheduler``. Attributes other than the backend interface,
+  such as ``ShinyACLMemoryBackend.calls``, are those of ``backend``."""
+
+  def __init__(self, backend, scheduler):
+    """ShinyACLThrottledBackend class initialization method.
+
+    :param backend: Backend to pace
+    :type backend: :py:class:`shinyacl.ShinyACLBackend.ShinyACLLocalBackend`
+    :param scheduler: Scheduler admitting calls
+    :type scheduler: :py:class:`shinyacl.ShinyACLScheduler.ShinyACLScheduler`
+    """
+
+    self.backend = backend
+    self.scheduler = scheduler
+
+  def __getattr__(self, name):
+    return getattr(self.backend, name)
+
+  def listdir(self, path):
+    with self.scheduler.slot('meta'):
+      return self.backend.listdir(path)
+
+  def realpath(self, path):
+    with self.scheduler.slot('meta'):
+      return self.backend.realpath(path)
+
+  def isdir(self, path):
+    with self.scheduler.slot('meta'):
+      return self.backend.isdir(path)
+
+  def isfile(self, path):
+    with self.scheduler.slot('meta'):
+      return self.backend.isfile(path)
+
+  def read(self, path):
+    with self.scheduler.slot('read'):
+      return self.backend.read(path)
+
+  def write(self, path, data):
+    with self.scheduler.slot('write'):
+      return self.backend.write(path, data)
+
+  def touch(self, path):
+    with self.scheduler.slot('reload'):
+      return self.backend.touch(path)
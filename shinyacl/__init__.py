@@ -1,6 +1,23 @@
 from .ShinyACLExceptions import ShinyACLUserAlreadyExists, \
 ShinyACLUserDoesNotExist, \
 ShinyACLNotAShinyApp, \
-ShinyACLNotAValidEmail
+ShinyACLNotAValidEmail, \
+ShinyACLInvalidExpiry, \
+ShinyACLConfModified, \
+ShinyACLCatalogIncomplete
+from .ShinyACLMetrics import ShinyACLMetrics, ShinyACLNullMetrics
+from .ShinyACLBackend import ShinyACLLocalBackend, ShinyACLMemoryBackend
+from .ShinyACLCatalog import ShinyACLCatalog
+from .ShinyACLScheduler import ShinyACLScheduler, ShinyACLThrottledBackend
+from .ShinyACLExpiry import ShinyACLExpiryIndex
+from .ShinyACLInventory import ShinyACLProject, ShinyACLUsers, \
+ShinyACLInventory
 from .ShinyACL import ShinyACL
+from .ShinyACLCompletion import ShinyACLCompletionCache
 from .ShinyACLConsole import ShinyACLConsole
+
+try:
+  from .ShinyACLAsync import AsyncShinyACL
+except ImportError:
+  # AsyncShinyACL requires asyncio (or trollius and futures on Python 2)
+  pass
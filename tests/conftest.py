@@ -1,6 +1,47 @@
 import pytest
 
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
 @pytest.fixture(scope="module")
 def shinyacl():
   from shinyacl import ShinyACL
   return ShinyACL
+
+@pytest.fixture
+def memorybackend():
+  """An in-memory copy of the fixtures tree: project space ``project``
+  with apps ``app1``, ``app3``, ``app4`` and ``app5`` and a plain
+  directory ``app2_not_a_shiny_app``."""
+  from shinyacl import ShinyACLMemoryBackend
+
+  fs = ShinyACLMemoryBackend()
+  project = PROJECT
+
+  for app in ('app1', 'app3', 'app4'):
+    fs.mkdir('{0}/{1}'.format(project, app))
+    fs.write('{0}/{1}/server.R'.format(project, app), '')
+  fs.mkdir('{0}/app5'.format(project))
+  fs.write('{0}/app5/index.Rmd'.format(project), '')
+  fs.mkdir('{0}/app2_not_a_shiny_app'.format(project))
+  fs.write('{0}/app3/.shiny_app.conf'.format(project),
+    'required_user a@a.com b@b.com;\n')
+
+  fs.mkdir(ROOT)
+  fs.symlink(project, '{0}/project'.format(ROOT))
+  fs.calls = {}
+  return fs
+
+@pytest.fixture
+def console(shinyacl, memorybackend, monkeypatch):
+  """A ``ShinyACLConsole`` on ``memorybackend``, both for its methods
+  and for the ``ShinyACL`` its ``run`` builds."""
+  import sys
+  from shinyacl import ShinyACLConsole
+
+  monkeypatch.setattr(sys.modules['shinyacl.ShinyACLConsole'], 'ShinyACL',
+    lambda **kwargs: shinyacl(ROOT, backend=memorybackend, **kwargs))
+  console = ShinyACLConsole()
+  console.acl = shinyacl(ROOT, backend=memorybackend, metrics=console.metrics)
+  memorybackend.calls = {}
+  return console
@@ -0,0 +1,129 @@
+import pytest
+import time
+
+ShinyACLAsync = pytest.importorskip('shinyacl.ShinyACLAsync')
+asyncio = ShinyACLAsync.asyncio
+
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+@pytest.fixture
+def loop():
+  loop = asyncio.new_event_loop()
+  yield loop
+  loop.close()
+
+class TestAsyncShinyACLClass:
+  def test_get_users(self, loop, memorybackend):
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+
+    assert loop.run_until_complete(acl.get_users(
+      '{0}/app3'.format(PROJECT))) == ['a@a.com', 'b@b.com']
+    acl.close()
+
+  def test_app_tree_scanned_once(self, loop, memorybackend):
+    "Concurrent requests should share one app tree."
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+
+    loop.run_until_complete(asyncio.gather(
+      acl.list_applications(), acl.list_applications(),
+      acl.get_users('{0}/app1'.format(PROJECT))))
+
+    assert memorybackend.calls['listdir'] == 2
+    acl.close()
+
+  def test_writes_to_same_app_are_serialized(self, loop, memorybackend):
+    "Concurrent adds to one app should not lose updates."
+    memorybackend.latency = {'write': 0.01, 'read': 0.01}
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+    app = '{0}/app4'.format(PROJECT)
+
+    loop.run_until_complete(asyncio.gather(
+      *map(lambda n: acl.add_user(app, ['user{0}@a.com'.format(n)]),
+        range(4))))
+
+    assert sorted(loop.run_until_complete(acl.get_users(app))) == \
+      map(lambda n: 'user{0}@a.com'.format(n), range(4))
+    acl.close()
+
+  def test_spellings_of_one_app_are_serialized(self, loop, memorybackend,
+    monkeypatch):
+    "Adds naming one app differently should still not lose updates."
+    memorybackend.latency = {'write': 0.01, 'read': 0.01}
+    monkeypatch.setattr('os.getcwd', lambda: PROJECT)
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+    app = '{0}/app4'.format(PROJECT)
+    spellings = [app, 'project/app4', 'app4', '{0}/project/app4'.format(ROOT)]
+
+    loop.run_until_complete(asyncio.gather(
+      *map(lambda (n, a): acl.add_user(a, ['u{0}@a.com'.format(n)]),
+        enumerate(spellings))))
+
+    assert loop.run_until_complete(acl.get_users(app)) == \
+      map(lambda n: 'u{0}@a.com'.format(n), range(4))
+    acl.close()
+
+  def test_writes_to_different_apps_run_concurrently(self, loop,
+    memorybackend):
+    memorybackend.latency = {'touch': 0.2}
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+    loop.run_until_complete(acl.list_applications())
+
+    start = time.time()
+    loop.run_until_complete(asyncio.gather(
+      *map(lambda a: acl.reload('{0}/{1}'.format(PROJECT, a)),
+        ['app1', 'app3', 'app4'])))
+
+    assert time.time() - start < 0.4
+    acl.close()
+
+  def test_exceptions_are_propagated(self, loop, memorybackend):
+    from shinyacl import ShinyACLNotAShinyApp
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+
+    with pytest.raises(ShinyACLNotAShinyApp):
+      loop.run_until_complete(acl.get_users('{0}/app2'.format(PROJECT)))
+    acl.close()
+
+  def test_failed_construction_is_retried(self, loop, memorybackend):
+    "One filer error on the first request should not fail every later one."
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+    listdir = memorybackend.listdir
+
+    def failing(path):
+      raise OSError(5, 'Input/output error', path)
+
+    memorybackend.listdir = failing
+    with pytest.raises(OSError):
+      loop.run_until_complete(acl.get_users('{0}/app3'.format(PROJECT)))
+
+    memorybackend.listdir = listdir
+    assert loop.run_until_complete(acl.get_users(
+      '{0}/app3'.format(PROJECT))) == ['a@a.com', 'b@b.com']
+    acl.close()
+
+  def test_refresh_keeps_one_syslog_handler(self, loop, memorybackend):
+    "Audit lines must be sent once, however often the tree is rebuilt."
+    import logging
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+
+    for i in range(5):
+      loop.run_until_complete(acl.refresh())
+
+    assert len(logging.getLogger('shinyacl.ShinyACL').handlers) == 1
+    acl.close()
+
+  def test_refresh_finds_new_apps(self, loop, memorybackend):
+    from shinyacl import ShinyACLNotAShinyApp
+    acl = ShinyACLAsync.AsyncShinyACL(ROOT, backend=memorybackend, loop=loop)
+    app = '{0}/app6'.format(PROJECT)
+    loop.run_until_complete(acl.list_applications())
+
+    memorybackend.mkdir(app)
+    memorybackend.write('{0}/server.R'.format(app), '')
+    with pytest.raises(ShinyACLNotAShinyApp):
+      loop.run_until_complete(acl.get_users(app))
+
+    loop.run_until_complete(acl.refresh())
+    assert loop.run_until_complete(acl.get_users(app)) == []
+    acl.close()
@@ -0,0 +1,60 @@
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+class TestShinyACLMemoryBackend:
+  def test_build_shiny_app_tree(self, shinyacl, memorybackend):
+    "Project spaces and apps should be discovered through the backend."
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert acl.__apps__.keys() == [PROJECT]
+    assert sorted(acl.__apps__[PROJECT]) == map(
+      lambda a: '{0}/{1}'.format(PROJECT, a), ['app1', 'app3', 'app4', 'app5'])
+
+  def test_get_users(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert acl.get_users('{0}/app3'.format(PROJECT)) == ['a@a.com', 'b@b.com']
+    assert acl.get_users('{0}/app1'.format(PROJECT)) == []
+
+  def test_add_and_del_user(self, shinyacl, memorybackend):
+    "Adding and removing users should not touch disk."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app = '{0}/app4'.format(PROJECT)
+
+    acl.add_user(app, ['a@a.com', '12345678'])
+    assert acl.get_users(app) == ['a@a.com', '12345678']
+
+    acl.del_user(app, ['a@a.com'])
+    assert memorybackend.read('{0}/.shiny_app.conf'.format(app)) == \
+      'required_user 12345678;\n'
+
+  def test_write_keeps_other_directives(self, shinyacl, memorybackend):
+    "Only the required_user line should be replaced."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app = '{0}/app1'.format(PROJECT)
+    memorybackend.write('{0}/.shiny_app.conf'.format(app),
+      'run_as shiny;\nrequired_user a@a.com;\nlog_dir /tmp')
+
+    acl.add_user(app, ['b@b.com'])
+
+    assert memorybackend.read('{0}/.shiny_app.conf'.format(app)) == \
+      'run_as shiny;\nrequired_user a@a.com b@b.com;\nlog_dir /tmp'
+
+  def test_reload(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app = '{0}/app4'.format(PROJECT)
+
+    acl.reload(app)
+
+    assert memorybackend.isfile('{0}/restart.txt'.format(app))
+    assert memorybackend.calls['touch'] == 1
+
+  def test_injected_latency(self, shinyacl, memorybackend):
+    "Latency should be injected per call."
+    import time
+    memorybackend.latency = {'isfile': 0.01}
+
+    start = time.time()
+    shinyacl(ROOT, backend=memorybackend).__apps__
+
+    assert time.time() - start >= 0.01 * memorybackend.calls['isfile']
@@ -0,0 +1,96 @@
+import pytest
+
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+@pytest.fixture
+def catalogacl(shinyacl, memorybackend):
+  from shinyacl import ShinyACLCatalog
+  return shinyacl(ROOT, backend=memorybackend,
+                  catalog=ShinyACLCatalog(':memory:'))
+
+class TestShinyACLCatalogClass:
+  def test_get_users_imports_app(self, catalogacl, memorybackend):
+    "The first read imports the app, later reads come from the catalog."
+    app = '{0}/app3'.format(PROJECT)
+
+    assert catalogacl.get_users(app) == ['a@a.com', 'b@b.com']
+    memorybackend.calls = {}
+    assert catalogacl.get_users(app) == ['a@a.com', 'b@b.com']
+    assert 'read' not in memorybackend.calls
+
+  def test_writes_materialize_conf(self, catalogacl, memorybackend):
+    app = '{0}/app4'.format(PROJECT)
+
+    catalogacl.add_user(app, ['b@b.com', 'a@a.com'])
+    catalogacl.del_user(app, ['b@b.com'])
+
+    assert catalogacl.catalog.get_users(app) == ['a@a.com']
+    assert memorybackend.read('{0}/.shiny_app.conf'.format(app)) == \
+      'required_user a@a.com;\n'
+
+  def test_who_has_access_and_counts(self, catalogacl):
+    catalogacl.verify_catalog()
+    catalogacl.add_user('{0}/app1'.format(PROJECT), ['a@a.com'])
+
+    assert catalogacl.catalog.who_has_access('a@a.com') == [
+      '{0}/app1'.format(PROJECT), '{0}/app3'.format(PROJECT)]
+    assert catalogacl.catalog.count_by_project() == [(PROJECT, 4, 3)]
+
+  def test_verify_catalog_detects_edits(self, catalogacl, memorybackend):
+    "Out of band edits should be detected by content hash."
+    app = '{0}/app3'.format(PROJECT)
+    assert catalogacl.verify_catalog() == []
+
+    memorybackend.write('{0}/.shiny_app.conf'.format(app),
+      'required_user c@c.com;\n')
+
+    assert catalogacl.verify_catalog() == [app]
+    assert catalogacl.get_users(app) == ['a@a.com', 'b@b.com']
+    assert catalogacl.verify_catalog(resync=True) == [app]
+    assert catalogacl.get_users(app) == ['c@c.com']
+    assert catalogacl.verify_catalog() == []
+
+  def test_write_after_hand_edit(self, catalogacl, memorybackend):
+    "A user revoked by hand must not come back with the next write."
+    from shinyacl import ShinyACLConfModified
+    app = '{0}/app3'.format(PROJECT)
+    conf = '{0}/.shiny_app.conf'.format(app)
+
+    assert catalogacl.get_users(app) == ['a@a.com', 'b@b.com']
+    memorybackend.write(conf, 'required_user a@a.com;\n')
+    catalogacl.add_user('app3', ['c@c.com'])
+
+    assert memorybackend.read(conf) == 'required_user a@a.com c@c.com;\n'
+    assert catalogacl.get_users(app) == ['a@a.com', 'c@c.com']
+
+    # An edit racing with the write itself is refused, not overwritten.
+    memorybackend.write(conf, 'required_user c@c.com;\n')
+    with pytest.raises(ShinyACLConfModified):
+      catalogacl.__write__(app, 'required_user a@a.com b@b.com;\n')
+    assert memorybackend.read(conf) == 'required_user c@c.com;\n'
+    assert catalogacl.get_users(app) == ['c@c.com']
+
+  def test_verify_catalog_prunes_deleted_apps(self, catalogacl):
+    "Rows of apps which no longer exist are drift, and resync removes them."
+    gone = '{0}/app9'.format(PROJECT)
+    catalogacl.verify_catalog()
+    catalogacl.catalog.set_users(gone, PROJECT, ['guest@g.com'], None)
+
+    assert catalogacl.verify_catalog() == [gone]
+    assert catalogacl.catalog.who_has_access('guest@g.com') == [gone]
+    assert catalogacl.verify_catalog(resync=True) == [gone]
+    assert catalogacl.catalog.who_has_access('guest@g.com') == []
+    assert catalogacl.catalog.count_by_project() == [(PROJECT, 4, 2)]
+    assert catalogacl.verify_catalog() == []
+
+  def test_who_has_access_needs_full_import(self, catalogacl):
+    "Apps read one at a time do not make the catalog complete."
+    from shinyacl import ShinyACLCatalogIncomplete
+    catalogacl.get_users('{0}/app3'.format(PROJECT))
+
+    with pytest.raises(ShinyACLCatalogIncomplete):
+      catalogacl.catalog.who_has_access('a@a.com')
+    catalogacl.verify_catalog()
+    assert catalogacl.catalog.who_has_access('a@a.com') == [
+      '{0}/app3'.format(PROJECT)]
@@ -0,0 +1,146 @@
+import os
+import errno
+import stat
+
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+class TestShinyACLCheckConf:
+  def test_clean_conf(self):
+    from shinyacl.ShinyACLCheck import check_conf
+
+    assert check_conf('required_user a@a.com 12345678;\n') == ([], None)
+    assert check_conf('run_as shiny;\n') == ([], None)
+    assert check_conf('') == ([], None)
+
+  def test_problems_are_classified(self):
+    from shinyacl.ShinyACLCheck import check_conf
+
+    assert check_conf('required_user a@a.com a@a.com foo;\n') == (
+      ['duplicate-user', 'invalid-user'], 'required_user a@a.com;\n')
+    assert check_conf('required_user a@a.com b@b.com\n') == (
+      ['missing-semicolon'], 'required_user ;\n')
+
+  def test_repair_keeps_effective_line(self):
+    "The users get_users reports are kept, other directives untouched."
+    from shinyacl.ShinyACLCheck import check_conf
+
+    assert check_conf('required_user c@c.com\nrun_as shiny;\n'
+      'required_user a@a.com;\nrequired_user b@b.com;') == (
+      ['missing-semicolon', 'multiple-required-user'],
+      'required_user a@a.com;\nrun_as shiny;\n')
+
+  def test_lines_are_read_as_get_users_reads_them(self):
+    "Repairs never grant users get_users does not report."
+    from shinyacl.ShinyACLCheck import check_conf
+
+    assert check_conf('required_user a@a.com;\r\nrun_as shiny;\r\n') == (
+      [], None)
+    assert check_conf('required_user a@a.com a@a.com;\r\n') == (
+      ['duplicate-user'], 'required_user a@a.com;\r\n')
+    assert check_conf('  required_user a@a.com;\n') == (
+      ['indented-required-user'], 'required_user ;\n')
+    assert check_conf('\trequired_user c@c.com;\nrequired_user a@a.com;\n') \
+      == (['indented-required-user', 'multiple-required-user'],
+      'required_user a@a.com;\n')
+
+class TestShinyACLCheck:
+  def test_check_and_repair(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app1 = '{0}/app1'.format(PROJECT)
+    app3 = '{0}/app3'.format(PROJECT)
+    memorybackend.write('{0}/.shiny_app.conf'.format(app1),
+      'required_user a@a.com a@a.com;\nrequired_user b@b.com;\n')
+    memorybackend.calls = {}
+
+    assert acl.check() == ({app1: ['duplicate-user', 'multiple-required-user'],
+                            app3: []}, {})
+    assert 'write' not in memorybackend.calls
+
+    assert acl.check(repair=True, max_workers=2)[0][app1] == [
+      'duplicate-user', 'multiple-required-user']
+    assert memorybackend.calls['write'] == 1
+    assert memorybackend.calls['touch'] == 1
+    assert memorybackend.read('{0}/.shiny_app.conf'.format(app1)) == \
+      'required_user a@a.com;\n'
+    assert acl.check()[0][app1] == []
+
+  def test_add_user_to_crlf_conf(self, shinyacl, memorybackend):
+    "The existing line is replaced, not shadowed by an appended one."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    conf = '{0}/app1/.shiny_app.conf'.format(PROJECT)
+    memorybackend.write(conf, 'required_user a@a.com;\r\nrun_as shiny;\r\n')
+
+    acl.add_user('app1', ['b@b.com'])
+
+    assert acl.get_users('app1') == ['a@a.com', 'b@b.com']
+    assert memorybackend.read(conf) == \
+      'required_user a@a.com b@b.com;\nrun_as shiny;\r\n'
+
+  def test_check_with_no_workers(self, shinyacl, memorybackend):
+    "A worker count below one still checks every application."
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert sorted(acl.check(max_workers=0)[0]) == [
+      '{0}/app3'.format(PROJECT)]
+
+class TestShinyACLLocalBackendWrite:
+  def test_write_is_atomic_and_keeps_mode(self, tmpdir):
+    from shinyacl import ShinyACLLocalBackend
+    path = str(tmpdir.join('.shiny_app.conf'))
+    backend = ShinyACLLocalBackend()
+
+    backend.write(path, 'required_user a@a.com;\n')
+    os.chmod(path, 0664)
+    inode = os.stat(path).st_ino
+    backend.write(path, 'required_user b@b.com;\n')
+
+    assert backend.read(path) == 'required_user b@b.com;\n'
+    assert os.stat(path).st_ino != inode
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0664
+    assert os.listdir(str(tmpdir)) == ['.shiny_app.conf']
+
+  def test_write_keeps_group(self, tmpdir):
+    from shinyacl import ShinyACLLocalBackend
+    path = str(tmpdir.join('.shiny_app.conf'))
+    backend = ShinyACLLocalBackend()
+    backend.write(path, 'required_user a@a.com;\n')
+    gid = os.getgroups()[-1] if os.getuid() != 0 else 12345
+    os.chown(path, -1, gid)
+
+    backend.write(path, 'required_user b@b.com;\n')
+
+    assert os.stat(path).st_gid == gid
+    assert backend.read(path) == 'required_user b@b.com;\n'
+
+  def test_write_in_place_when_group_cannot_be_kept(self, tmpdir,
+    monkeypatch):
+    from shinyacl import ShinyACLLocalBackend
+    path = str(tmpdir.join('.shiny_app.conf'))
+    backend = ShinyACLLocalBackend()
+    backend.write(path, 'required_user a@a.com;\n')
+    inode = os.stat(path).st_ino
+
+    def chown(path, uid, gid):
+      raise OSError(errno.EPERM, 'Operation not permitted', path)
+
+    monkeypatch.setattr(os, 'chown', chown)
+    backend.write(path, 'required_user b@b.com;\n')
+
+    assert backend.read(path) == 'required_user b@b.com;\n'
+    assert os.stat(path).st_ino == inode
+    assert os.listdir(str(tmpdir)) == ['.shiny_app.conf']
+
+  def test_write_through_symlink(self, tmpdir):
+    "The link is kept and its target rewritten."
+    from shinyacl import ShinyACLLocalBackend
+    target = str(tmpdir.join('shared.conf'))
+    path = str(tmpdir.join('.shiny_app.conf'))
+    backend = ShinyACLLocalBackend()
+    backend.write(target, 'required_user a@a.com;\n')
+    os.symlink(target, path)
+
+    backend.write(path, 'required_user b@b.com;\n')
+
+    assert os.path.islink(path)
+    assert backend.read(target) == 'required_user b@b.com;\n'
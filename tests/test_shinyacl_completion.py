@@ -0,0 +1,45 @@
+import os
+import fcntl
+
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+class TestShinyACLCompletionCache:
+  def test_refresh_indexes_apps_and_users(self, shinyacl, memorybackend,
+    tmpdir):
+    from shinyacl import ShinyACLCompletionCache
+    cache = ShinyACLCompletionCache(str(tmpdir.join('cache', 'completion')))
+
+    assert cache.read() == []
+    assert cache.refresh(shinyacl(ROOT, backend=memorybackend)) == 4
+    assert cache.read() == [
+      ('{0}/app1'.format(PROJECT), 'project/app1', []),
+      ('{0}/app3'.format(PROJECT), 'project/app3', ['a@a.com', 'b@b.com']),
+      ('{0}/app4'.format(PROJECT), 'project/app4', []),
+      ('{0}/app5'.format(PROJECT), 'project/app5', [])]
+
+  def test_staleness(self, shinyacl, memorybackend, tmpdir):
+    "An invalidated index is stale but still served."
+    from shinyacl import ShinyACLCompletionCache
+    cache = ShinyACLCompletionCache(str(tmpdir.join('completion')))
+
+    assert cache.is_stale()
+    cache.refresh(shinyacl(ROOT, backend=memorybackend))
+    assert not cache.is_stale()
+    assert cache.is_stale(now=os.path.getmtime(cache.path) + 301)
+
+    cache.invalidate()
+    assert cache.is_stale()
+    assert len(cache.read()) == 4
+
+  def test_concurrent_refresh_is_skipped(self, shinyacl, memorybackend,
+    tmpdir):
+    from shinyacl import ShinyACLCompletionCache
+    cache = ShinyACLCompletionCache(str(tmpdir.join('completion')))
+
+    with open('{0}.lock'.format(cache.path), 'a') as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      assert cache.refresh(shinyacl(ROOT, backend=memorybackend)) is None
+
+    assert 'read' not in memorybackend.calls
+    assert not os.path.exists(cache.path)
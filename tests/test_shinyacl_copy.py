@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import ROOT, PROJECT
+
+class TestShinyACLCopyACL:
+  def test_copy_writes_only_differing_apps(self, shinyacl, memorybackend):
+    "Apps which already have the source's users are neither written nor reloaded."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app1, app3, app4, app5 = map(lambda a: '{0}/{1}'.format(PROJECT, a),
+      ['app1', 'app3', 'app4', 'app5'])
+    memorybackend.write('{0}/.shiny_app.conf'.format(app4),
+      'required_user b@b.com a@a.com;\n')
+    memorybackend.calls = {}
+
+    changed, failed = acl.copy_acl(app3, [app1, 'project/app4', 'app5', app3])
+
+    assert sorted(changed) == [app1, app5]
+    assert failed == {}
+    assert memorybackend.calls['write'] == 2
+    assert memorybackend.calls['touch'] == 2
+    for app in [app1, app5]:
+      assert acl.get_users(app) == ['a@a.com', 'b@b.com']
+      assert memorybackend.isfile('{0}/restart.txt'.format(app))
+    assert not memorybackend.isfile('{0}/restart.txt'.format(app4))
+
+  def test_copy_reports_failed_apps(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app1 = '{0}/app1'.format(PROJECT)
+    app5 = '{0}/app5'.format(PROJECT)
+    write = memorybackend.write
+
+    def failing(path, data):
+      if path.startswith(app1):
+        raise IOError('Permission denied')
+      return write(path, data)
+
+    memorybackend.write = failing
+    changed, failed = acl.copy_acl('app3', [app1, app5], max_workers=1)
+
+    assert changed == [app5]
+    assert failed.keys() == [app1]
+    assert acl.get_users(app1) == []
+
+  def test_copy_unknown_destination(self, shinyacl, memorybackend):
+    "Nothing is written when a destination is not an app."
+    from shinyacl import ShinyACLNotAShinyApp
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    with pytest.raises(ShinyACLNotAShinyApp):
+      acl.copy_acl('app3', ['app1', 'app2_not_a_shiny_app'])
+    assert 'write' not in memorybackend.calls
+
+class TestShinyACLConsoleCopyACL:
+  def test_copy_carries_deadlines(self, console, memorybackend, tmpdir):
+    "A guest expiring on the source should expire on the copies too."
+    from shinyacl import ShinyACLExpiryIndex
+    path = str(tmpdir.join('expiries'))
+    app1, app3, app4 = map(lambda a: '{0}/{1}'.format(PROJECT, a),
+      ['app1', 'app3', 'app4'])
+
+    with ShinyACLExpiryIndex(path) as index:
+      index.add(app3, 'b@b.com', 2000000000)
+      index.add(app1, 'old@a.com', 2000000000)
+      index.add(app4, 'a@a.com', 1900000000)
+    memorybackend.write('{0}/.shiny_app.conf'.format(app4),
+      'required_user a@a.com b@b.com;\n')
+
+    console.copy_acl(path, 'app3', ['app1', 'app4'])
+
+    with ShinyACLExpiryIndex(path) as index:
+      assert index.pending() == [(1900000000, app4, 'a@a.com'),
+                                 (2000000000, app1, 'b@b.com'),
+                                 (2000000000, app3, 'b@b.com')]
@@ -0,0 +1,126 @@
+import pytest
+
+from conftest import ROOT, PROJECT
+
+class TestShinyACLExpiryIndexClass:
+  def test_parse_expiry(self):
+    from shinyacl import ShinyACLInvalidExpiry
+    from shinyacl.ShinyACLExpiry import parse_expiry
+
+    assert parse_expiry('2016-08-31', now=0) - \
+      parse_expiry('2016-08-31T00:00', now=0) == 86400
+
+    with pytest.raises(ShinyACLInvalidExpiry):
+      parse_expiry('2016-08-31')
+    with pytest.raises(ShinyACLInvalidExpiry):
+      parse_expiry('next tuesday')
+
+  def test_due_pops_only_expired(self, tmpdir):
+    "Grants should come back earliest first, replaced deadlines dropped."
+    from shinyacl import ShinyACLExpiryIndex
+    path = str(tmpdir.join('expiries'))
+
+    with ShinyACLExpiryIndex(path) as index:
+      index.add('/app1', 'a@a.com', 30)
+      index.add('/app2', 'b@b.com', 10)
+      index.add('/app1', 'c@c.com', 20)
+      index.add('/app1', 'a@a.com', 40)
+
+    with ShinyACLExpiryIndex(path) as index:
+      assert index.due(now=35) == [(10, '/app2', 'b@b.com'),
+                                   (20, '/app1', 'c@c.com')]
+
+    with ShinyACLExpiryIndex(path) as index:
+      assert index.pending() == [(40, '/app1', 'a@a.com')]
+
+  def test_discard(self, tmpdir):
+    from shinyacl import ShinyACLExpiryIndex
+
+    with ShinyACLExpiryIndex(str(tmpdir.join('expiries'))) as index:
+      index.add('/app1', 'a@a.com', 30)
+      index.add('/app1', 'b@b.com', 30)
+      index.add('/app2', 'a@a.com', 30)
+      index.discard('/app1', ['a@a.com'])
+      assert len(index) == 2
+      index.discard('/app1')
+      assert index.pending() == [(30, '/app2', 'a@a.com')]
+
+class TestShinyACLExpireDue:
+  def test_expire_due_writes_once_per_app(self, shinyacl, memorybackend,
+    tmpdir):
+    from shinyacl import ShinyACLExpiryIndex
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app3 = '{0}/app3'.format(PROJECT)
+
+    with ShinyACLExpiryIndex(str(tmpdir.join('expiries'))) as index:
+      index.add(app3, 'a@a.com', 10)
+      index.add(app3, 'b@b.com', 20)
+      index.add(app3, 'gone@a.com', 20)
+      index.add('{0}/app4'.format(PROJECT), 'a@a.com', 100)
+      memorybackend.calls = {}
+
+      assert acl.expire_due(index, now=50) == {app3: ['a@a.com', 'b@b.com']}
+      assert len(index) == 1
+
+    assert memorybackend.calls['write'] == 1
+    assert 'listdir' not in memorybackend.calls
+    assert acl.get_users(app3) == []
+
+  def test_expire_due_keeps_grants_of_unreachable_apps(self, shinyacl,
+    memorybackend, tmpdir):
+    "A failing isdir puts grants back; only a missing app drops them."
+    from shinyacl import ShinyACLExpiryIndex
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app3 = '{0}/app3'.format(PROJECT)
+    gone = '{0}/app9'.format(PROJECT)
+    isdir = memorybackend.isdir
+    memorybackend.isdir = lambda path: False
+
+    with ShinyACLExpiryIndex(str(tmpdir.join('expiries'))) as index:
+      index.add(app3, 'a@a.com', 10)
+      index.add(gone, 'a@a.com', 10)
+
+      assert acl.expire_due(index, now=50) == {}
+      assert index.pending() == [(10, app3, 'a@a.com')]
+
+      memorybackend.isdir = isdir
+      assert acl.expire_due(index, now=50) == {app3: ['a@a.com']}
+      assert len(index) == 0
+
+    assert acl.get_users(app3) == ['b@b.com']
+
+class TestShinyACLConsoleAddUser:
+  def run(self, console, monkeypatch, tmpdir, index, *argv):
+    import sys
+    monkeypatch.setenv('HOME', str(tmpdir))
+    monkeypatch.setattr(sys, 'argv', ['rshiny_acl', '--expiry-index', index,
+      '--expires', '2099-01-01', '--add-user'] + list(argv))
+    return console.run()
+
+  def test_deadlines_for_added_users_only(self, console, shinyacl,
+    memorybackend, monkeypatch, tmpdir):
+    "A user already on the ACL keeps their access, the others expire."
+    from shinyacl import ShinyACLExpiryIndex
+    app3 = '{0}/app3'.format(PROJECT)
+    index = str(tmpdir.join('expiries'))
+
+    self.run(console, monkeypatch, tmpdir, index, 'app3', 'c@c.com',
+      'a@a.com', 'd@d.com')
+
+    assert shinyacl(ROOT, backend=memorybackend).get_users(app3) == [
+      'a@a.com', 'b@b.com', 'c@c.com']
+    with ShinyACLExpiryIndex(index) as expiries:
+      assert map(lambda (d, a, u): (a, u), expiries.pending()) == [
+        (app3, 'c@c.com')]
+    assert memorybackend.isfile('{0}/restart.txt'.format(app3))
+
+  def test_reload_when_deadline_fails(self, console, shinyacl,
+    memorybackend, monkeypatch, tmpdir):
+    app1 = '{0}/app1'.format(PROJECT)
+
+    self.run(console, monkeypatch, tmpdir,
+      str(tmpdir.join('missing', 'expiries')), 'app1', 'c@c.com')
+
+    assert shinyacl(ROOT, backend=memorybackend).get_users(app1) == [
+      'c@c.com']
+    assert memorybackend.isfile('{0}/restart.txt'.format(app1))
@@ -0,0 +1,98 @@
+import pytest
+
+from conftest import ROOT, PROJECT
+
+class TestShinyACLFindApplications:
+  def test_tree_is_built_lazily(self, shinyacl, memorybackend):
+    "Constructing ShinyACL should not scan project spaces."
+    shinyacl(ROOT, backend=memorybackend)
+
+    assert memorybackend.calls == {'listdir': 1, 'realpath': 1}
+
+  def test_pattern_is_pushed_down(self, shinyacl, memorybackend):
+    "Entries not matching the glob should never be stat'ed."
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert acl.find_applications(pattern='app[34]') == [
+      (PROJECT, '{0}/app3'.format(PROJECT)),
+      (PROJECT, '{0}/app4'.format(PROJECT))]
+    assert memorybackend.calls['isdir'] == 2
+
+  def test_regex_sort_and_limit(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert acl.find_applications(regex='^app[0-9]$', limit=3) == map(
+      lambda a: (PROJECT, '{0}/{1}'.format(PROJECT, a)),
+      ['app1', 'app3', 'app4'])
+    assert memorybackend.calls['isdir'] == 3
+
+  def test_negative_limit(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    for sort in ['path', 'name']:
+      with pytest.raises(ValueError):
+        acl.find_applications(sort=sort, limit=-1)
+
+  def test_project_filter(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert acl.find_applications(project='other') == []
+    assert 'isdir' not in memorybackend.calls
+    assert len(acl.find_applications(project='proj*')) == 4
+
+  def test_uses_built_tree(self, shinyacl, memorybackend):
+    "Once the tree is built, queries should not touch the backend."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    acl.__apps__
+    memorybackend.calls = {}
+
+    assert acl.find_applications(pattern='*5', sort='name') == [
+      (PROJECT, '{0}/app5'.format(PROJECT))]
+    assert memorybackend.calls == {}
+
+  def test_discover_is_lazy(self, shinyacl, memorybackend):
+    "Apps should be yielded as they are found, and scanning stop with them."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    apps = acl.discover()
+
+    assert 'isdir' not in memorybackend.calls
+    assert next(apps) == (PROJECT, '{0}/app1'.format(PROJECT))
+    assert memorybackend.calls['isdir'] == 1
+
+  def test_list_applications_formats(self, console, memorybackend, capsys):
+    import json
+
+    console.list_applications(limit=2, format='json')
+    assert map(json.loads, capsys.readouterr()[0].splitlines()) == [
+      {'project': PROJECT, 'app': '{0}/app1'.format(PROJECT)},
+      {'project': PROJECT, 'app': '{0}/app3'.format(PROJECT)}]
+    # app1, app2_not_a_shiny_app and app3; app4 and app5 are never stat'ed.
+    assert memorybackend.calls['isdir'] == 3
+
+    console.list_applications(pattern='*5', format='tsv')
+    assert capsys.readouterr()[0] == '{0}\t{0}/app5\n'.format(PROJECT)
+
+  def test_discovery_metrics(self, shinyacl, memorybackend):
+    "Only full scans count as discovery, and the consumer is not timed."
+    import time
+    from shinyacl import ShinyACLMetrics
+    metrics = ShinyACLMetrics()
+    acl = shinyacl(ROOT, backend=memorybackend, metrics=metrics)
+
+    for app in acl.discover():
+      time.sleep(0.02)
+    rendered = metrics.render()
+    assert 'shinyacl_project_apps{{project="{0}"}} 4.0'.format(PROJECT) in \
+      rendered
+    assert 'shinyacl_operations_total{operation="discovery"} 1.0' in rendered
+    assert 'shinyacl_operation_duration_seconds_bucket{operation="discovery",'\
+      'le="0.05"} 1' in rendered
+
+    metrics = acl.metrics = ShinyACLMetrics()
+    acl.find_applications(pattern='app[34]')
+    acl.find_applications(limit=1)
+    rendered = metrics.render()
+    assert 'shinyacl_project_apps' not in rendered
+    assert 'shinyacl_operations_total{operation="discovery_partial"} 2.0' in \
+      rendered
+    assert 'operation="discovery"' not in rendered
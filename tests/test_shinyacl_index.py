@@ -0,0 +1,53 @@
+import pytest
+
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+class TestShinyACLResolve:
+  def test_resolve_short_names(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app3 = '{0}/app3'.format(PROJECT)
+
+    assert acl.resolve(app3) == app3
+    assert acl.resolve('project/app3') == app3
+    assert acl.resolve('app3/') == app3
+    assert acl.get_users('project/app3') == ['a@a.com', 'b@b.com']
+
+  def test_resolve_through_shared_space(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    assert acl.resolve('{0}/project/app4'.format(ROOT)) == \
+      '{0}/app4'.format(PROJECT)
+
+  def test_resolve_ambiguous_name(self, shinyacl, memorybackend):
+    "A name shared by two project spaces should list both."
+    from shinyacl import ShinyACLNotAShinyApp
+    memorybackend.mkdir('/nfs/www/shinyserver/other/app3')
+    memorybackend.write('/nfs/www/shinyserver/other/app3/server.R', '')
+    memorybackend.symlink('/nfs/www/shinyserver/other',
+      '{0}/other'.format(ROOT))
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    with pytest.raises(ShinyACLNotAShinyApp) as e:
+      acl.resolve('app3')
+    assert e.value.suggestions == ['/nfs/www/shinyserver/other/app3',
+                                   '{0}/app3'.format(PROJECT)]
+    assert acl.resolve('other/app3') == '/nfs/www/shinyserver/other/app3'
+
+  def test_suggest_typos(self, shinyacl, memorybackend):
+    from shinyacl import ShinyACLNotAShinyApp
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    with pytest.raises(ShinyACLNotAShinyApp) as e:
+      acl.get_users('{0}/ap5'.format(PROJECT))
+    assert e.value.suggestions[0] == '{0}/app5'.format(PROJECT)
+    assert 'Did you mean' in str(e.value)
+
+  def test_no_suggestions(self, shinyacl, memorybackend):
+    from shinyacl import ShinyACLNotAShinyApp
+    acl = shinyacl(ROOT, backend=memorybackend)
+
+    with pytest.raises(ShinyACLNotAShinyApp) as e:
+      acl.get_users('zzzzzz')
+    assert e.value.suggestions == []
+    assert 'Troubleshooting' in str(e.value)
@@ -0,0 +1,57 @@
+import pytest
+
+ROOT = '/home/user/shared_space'
+PROJECT = '/nfs/www/shinyserver/project'
+
+class TestShinyACLProjectClass:
+  def test_behaves_like_list_of_paths(self):
+    from shinyacl import ShinyACLProject
+    project = ShinyACLProject('/p', ['b', 'a'])
+
+    assert project == ['/p/a', '/p/b']
+    assert project[0] == '/p/a'
+    assert '/p/b' in project
+    assert '/p/c' not in project
+    assert '/q/a' not in project
+    assert len(project) == 2
+
+  def test_uses_slots(self):
+    from shinyacl import ShinyACLProject, ShinyACLInventory
+
+    assert not hasattr(ShinyACLProject('/p', []), '__dict__')
+    assert not hasattr(ShinyACLInventory({}), '__dict__')
+
+class TestShinyACLInventoryClass:
+  def test_inventory(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+    inventory = acl.inventory()
+
+    assert len(inventory) == 4
+    assert inventory.grants() == 2
+    assert inventory.get_users('{0}/app3'.format(PROJECT)) == [
+      'a@a.com', 'b@b.com']
+    assert inventory.get_users('{0}/app1'.format(PROJECT)) == []
+
+  def test_inventories_are_independent(self, shinyacl, memorybackend):
+    "A second inventory should not disturb the first, nor the app tree."
+    acl = shinyacl(ROOT, backend=memorybackend)
+    app3 = '{0}/app3'.format(PROJECT)
+    first = acl.inventory()
+    acl.add_user('app1', ['c@c.com'])
+    second = acl.inventory()
+
+    assert first.get_users(app3) == ['a@a.com', 'b@b.com']
+    assert first.get_users('{0}/app1'.format(PROJECT)) == []
+    assert second.get_users('{0}/app1'.format(PROJECT)) == ['c@c.com']
+    assert acl.__apps__[PROJECT] == map(lambda a: '{0}/{1}'.format(PROJECT, a),
+      ['app1', 'app3', 'app4', 'app5'])
+
+  def test_usernames_are_coded_once(self, shinyacl, memorybackend):
+    acl = shinyacl(ROOT, backend=memorybackend)
+    inventory = acl.inventory()
+
+    inventory.set_users('{0}/app1'.format(PROJECT), ['b@b.com', 'c@c.com'])
+
+    assert inventory.users.names == ['a@a.com', 'b@b.com', 'c@c.com']
+    with pytest.raises(KeyError):
+      inventory.set_users('{0}/app2'.format(PROJECT), [])
@@ -0,0 +1,65 @@
+import pytest
+import os
+
+class TestShinyACLMetricsClass:
+  def test_track_counts_operations(self):
+    "Tracked operations should be counted and timed."
+    from shinyacl import ShinyACLMetrics
+
+    metrics = ShinyACLMetrics()
+    with metrics.track('reload'):
+      pass
+
+    rendered = metrics.render()
+    assert 'shinyacl_operations_total{operation="reload"} 1.0' in rendered
+    assert 'shinyacl_operation_duration_seconds_count{operation="reload"} 1.0' \
+      in rendered
+    assert 'shinyacl_operation_duration_seconds_bucket{operation="reload",le="+Inf"} 1.0' \
+      in rendered
+
+  def test_track_counts_exceptions(self):
+    "Exceptions raised while tracking should be counted and re-raised."
+    from shinyacl import ShinyACLMetrics
+
+    metrics = ShinyACLMetrics()
+    with pytest.raises(IOError):
+      with metrics.track('write'):
+        raise IOError('denied')
+
+    assert 'shinyacl_exceptions_total{exception="IOError",operation="write"} 1.0' \
+      in metrics.render()
+
+  def test_write_accumulates_counters(self, tmpdir):
+    "Counters should accumulate across writes, gauges should not."
+    from shinyacl import ShinyACLMetrics
+
+    path = str(tmpdir.join('rshiny_acl.prom'))
+
+    for apps, project in ((3, 'p'), (5, 'q')):
+      metrics = ShinyACLMetrics()
+      metrics.inc('shinyacl_operations_total', {'operation': 'reload'})
+      metrics.set('shinyacl_project_apps', apps, {'project': project})
+      metrics.write(path)
+
+    data = open(path).read()
+    assert 'shinyacl_operations_total{operation="reload"} 2.0' in data
+    assert 'shinyacl_project_apps{project="q"} 5.0' in data
+    assert 'shinyacl_project_apps{project="p"}' not in data
+    assert not filter(lambda f: f.endswith('.tmp'), os.listdir(str(tmpdir)))
+
+  def test_shinyacl_records_inventory(self, shinyacl):
+    "Using fixture, discovery and get_users should be recorded."
+    from shinyacl import ShinyACLMetrics
+
+    metrics = ShinyACLMetrics()
+    acl = shinyacl("{0}/fixtures/shared_space".format(
+                     os.path.dirname(os.path.realpath(__file__))),
+                   metrics=metrics)
+
+    acl.get_users('{0}/fixtures/nfs/www/shinyserver/project/app3'.
+      format(os.path.dirname(os.path.realpath(__file__))))
+
+    rendered = metrics.render()
+    assert 'shinyacl_operations_total{operation="discovery"} 1.0' in rendered
+    assert 'app3"} 2.0' in rendered
+    assert 'shinyacl_project_apps{project=' in rendered
@@ -0,0 +1,137 @@
+import pytest
+import threading
+
+from conftest import ROOT, PROJECT
+
+class FakeClock(object):
+  "A clock which only advances when slept on, or when told to."
+
+  def __init__(self):
+    self.now = 1000.0
+    self.slept = []
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.slept.append(seconds)
+    self.now += seconds
+
+class TestShinyACLTokenBucket:
+  def test_burst_then_rate(self):
+    from shinyacl.ShinyACLScheduler import ShinyACLTokenBucket
+    clock = FakeClock()
+    bucket = ShinyACLTokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+
+    assert [bucket.acquire() for i in range(4)] == pytest.approx(
+      [0, 0, 0.1, 0.1])
+    assert clock.now == pytest.approx(1000.2)
+
+  def test_set_rate(self):
+    from shinyacl.ShinyACLScheduler import ShinyACLTokenBucket
+    clock = FakeClock()
+    bucket = ShinyACLTokenBucket(1, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    bucket.set_rate(4)
+    assert bucket.acquire() == pytest.approx(0.25)
+
+class TestShinyACLScheduler:
+  def test_parse_io_limits(self):
+    from shinyacl.ShinyACLScheduler import parse_io_limits
+
+    assert parse_io_limits(None) == {}
+    assert parse_io_limits('8', int) == {'meta': 8, 'read': 8, 'write': 8,
+                                         'reload': 8}
+    assert parse_io_limits('meta=500, reload=2.5') == {'meta': 500.0,
+                                                       'reload': 2.5}
+    for value in ['stat=5', 'meta=0', 'meta=fast']:
+      with pytest.raises(ValueError):
+        parse_io_limits(value)
+
+  def test_concurrency_limit(self):
+    from shinyacl import ShinyACLScheduler
+    scheduler = ShinyACLScheduler(concurrency={'read': 2})
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'peak': 0}
+    release = threading.Event()
+
+    def read():
+      with scheduler.slot('read'):
+        with lock:
+          state['in_flight'] += 1
+          state['peak'] = max(state['peak'], state['in_flight'])
+        release.wait(5)
+        with lock:
+          state['in_flight'] -= 1
+
+    threads = [threading.Thread(target=read) for i in range(6)]
+    for t in threads:
+      t.start()
+    release.set()
+    for t in threads:
+      t.join()
+
+    assert state['peak'] <= 2
+
+  def test_backoff_and_recovery(self):
+    "Slow calls halve the rate, fast ones raise it back to the limit."
+    from shinyacl import ShinyACLScheduler
+    clock = FakeClock()
+    scheduler = ShinyACLScheduler(rates={'meta': 100}, target_latency=0.05,
+      clock=clock, sleep=clock.sleep)
+
+    def call(latency):
+      with scheduler.slot('meta'):
+        clock.now += latency
+      clock.now += 1
+
+    for i in range(3):
+      call(0.5)
+    assert scheduler.rate('meta') == 12.5
+
+    for i in range(20):
+      call(0.001)
+    assert scheduler.rate('meta') == 100
+    assert scheduler.rate('write') is None
+
+  def test_throttled_backend(self, shinyacl, memorybackend):
+    from shinyacl import ShinyACLScheduler, ShinyACLMetrics
+    clock = FakeClock()
+    metrics = ShinyACLMetrics()
+    acl = shinyacl(ROOT, backend=memorybackend, scheduler=ShinyACLScheduler(
+      rates={'meta': 2, 'reload': 1}, metrics=metrics, clock=clock,
+      sleep=clock.sleep))
+
+    assert acl.get_users('app3') == ['a@a.com', 'b@b.com']
+    acl.reload('{0}/app3'.format(PROJECT))
+    acl.reload('{0}/app4'.format(PROJECT))
+
+    # Every metadata call past the burst of two waits half a second, the
+    # second reload a second.
+    meta = sum(map(lambda c: memorybackend.calls.get(c, 0),
+      ['listdir', 'realpath', 'isdir', 'isfile']))
+    assert acl.backend.calls == memorybackend.calls
+    assert clock.now - 1000 == pytest.approx((meta - 2) / 2.0 + 1)
+    assert 'shinyacl_io_wait_seconds_total{class="reload"} 1.0' in \
+      metrics.render()
+
+  def test_console_paces_every_call(self, console, memorybackend,
+    monkeypatch, capsys):
+    "Calls made while ShinyACL is constructed are paced too."
+    import sys
+    from shinyacl import ShinyACLScheduler
+    monkeypatch.setattr(sys, 'argv', ['rshiny_acl', '--io-rate', '1000',
+      '--list-users', 'app3'])
+    slots = []
+    slot = ShinyACLScheduler.slot
+    monkeypatch.setattr(ShinyACLScheduler, 'slot',
+      lambda self, ioclass: slots.append(ioclass) or slot(self, ioclass))
+
+    console.run()
+
+    assert 'a@a.com' in capsys.readouterr()[0]
+    assert slots.count('meta') == sum(map(lambda c:
+      memorybackend.calls.get(c, 0), ['listdir', 'realpath', 'isdir',
+      'isfile']))
+    assert slots.count('read') == memorybackend.calls['read']